@@ -1,4 +1,9 @@
-from .app import main
+def main():
+    # Defer application import so worker processes only load the engine
+    from .app import main as app_main
+
+    app_main()
+
 
 __all__ = [
     "main",
@@ -1,4 +1,9 @@
-from .main import main
+def main():
+    # Defer layout/controller import so worker processes only load the engine
+    from .main import main as app_main
+
+    app_main()
+
 
 __all__ = [
     "main",
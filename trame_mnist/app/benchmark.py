@@ -0,0 +1,351 @@
+"""
+Headless benchmark of the engine hot paths.
+
+Runs against a small MNIST subset written into a temporary data directory
+so it works offline and never touches the application checkpoint:
+
+    python -m trame_mnist.app.benchmark --output results.json
+
+The JSON report can be diffed across versions and hardware.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+BENCHMARKS = ["training", "testing", "prediction", "xai", "charts"]
+
+MNIST_CACHE_DIR = Path(Path(__file__).parent.parent, "data", "MNIST", "cache")
+
+# -----------------------------------------------------------------------------
+# Dataset subset
+# -----------------------------------------------------------------------------
+
+
+def synthetic_split(size, seed):
+    """Digit-like images: random strokes in the center of a black background"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:28, :28]
+    images = np.zeros((size, 28, 28), dtype=np.uint8)
+    for image in images:
+        cx, cy = rng.uniform(10, 18, 2)
+        radius = rng.uniform(4, 8)
+        ring = np.abs(np.hypot(x - cx, y - cy) - radius) < rng.uniform(1, 2.5)
+        image[ring] = rng.integers(128, 256, int(ring.sum()))
+
+    labels = rng.integers(0, 10, size).astype(np.int64)
+    return images, labels
+
+
+def mnist_split(split, size, cache_dir=MNIST_CACHE_DIR):
+    images_path = Path(cache_dir, f"{split}-images.npy")
+    labels_path = Path(cache_dir, f"{split}-labels.npy")
+    if not images_path.exists() or not labels_path.exists():
+        raise FileNotFoundError(
+            f"No MNIST cache in {cache_dir}, run the application once to build it"
+        )
+
+    return (
+        np.load(images_path, mmap_mode="r")[:size],
+        np.load(labels_path, mmap_mode="r")[:size],
+    )
+
+
+def write_subset(data_dir, source, train_size, test_size, seed):
+    cache_dir = Path(data_dir, "MNIST", "cache")
+    cache_dir.mkdir(parents=True)
+    for split, size in (("train", train_size), ("test", test_size)):
+        if source == "synthetic":
+            images, labels = synthetic_split(size, seed + (split == "test"))
+        else:
+            images, labels = mnist_split(split, size)
+
+        np.save(Path(cache_dir, f"{split}-images.npy"), np.ascontiguousarray(images))
+        np.save(Path(cache_dir, f"{split}-labels.npy"), np.asarray(labels, np.int64))
+
+
+# -----------------------------------------------------------------------------
+# Timing helpers
+# -----------------------------------------------------------------------------
+
+
+def measure(function, repeat=5, setup=None):
+    """Wall time statistics (in seconds) of repeated calls"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+    }
+
+
+def environment():
+    import torch
+    from .engine.ml import config
+
+    try:
+        from importlib.metadata import version
+
+        package_version = version("trame-mnist")
+    except Exception:
+        package_version = None
+
+    return {
+        "trame_mnist": package_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "config": {
+            name: value
+            for name, value in vars(config).items()
+            if name.isupper() and name != "DATA_DIR"
+        },
+    }
+
+
+# -----------------------------------------------------------------------------
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+
+def bench_training(args):
+    from .engine.ml.common import LeNet5, Model
+    from .engine.ml.training import create_training_loaders
+
+    model = Model(LeNet5())
+    training_loader, validation_loader = create_training_loaders(
+        args.batch, validation_size=args.train_size // 6
+    )
+    training_samples = len(training_loader.indices)
+    validation_samples = len(validation_loader.indices)
+
+    def run_epoch():
+        model.train_step(training_loader)
+        model.validation_step(validation_loader)
+        model.epoch += 1
+
+    train_step = measure(lambda: model.train_step(training_loader), args.epochs)
+    validation_step = measure(
+        lambda: model.validation_step(validation_loader), args.epochs
+    )
+    epoch = measure(run_epoch, args.epochs)
+
+    # Checkpoint used by the other benchmarks
+    model.save()
+
+    return {
+        "batch_size": args.batch,
+        "train_step": {
+            **train_step,
+            "samples": training_samples,
+            "samples_per_second": training_samples / train_step["median"],
+        },
+        "validation_step": {
+            **validation_step,
+            "samples": validation_samples,
+            "samples_per_second": validation_samples / validation_step["median"],
+        },
+        "epoch": epoch,
+    }
+
+
+def bench_testing(args):
+    from .engine.ml import testing_run
+    from .engine.ml.common import MODEL_PATH
+    from .engine.ml.store import prediction_store_reset
+    from .engine.ml.testing import create_testing_loader
+
+    def clear_store():
+        prediction_store_reset()
+        for path in MODEL_PATH.parent.glob(f"{MODEL_PATH.name}.*.logits.npy"):
+            path.unlink()
+
+    loader = create_testing_loader()
+    return {
+        "samples": args.test_size,
+        "loader": measure(lambda: testing_run(loader), args.repeat),
+        "store_cold": measure(testing_run, args.repeat, setup=clear_store),
+        "store_warm": measure(testing_run, args.repeat),
+    }
+
+
+def bench_prediction(args):
+    from trame import state, controller as ctrl
+    from .engine import main, utils
+
+    # Same serialization as the VegaEmbed update in the UI
+    ctrl.chart_pred_update = lambda chart: chart.to_dict()
+    state.xai_viz = False
+    main.reset_model()
+
+    rng = np.random.default_rng(args.seed)
+    indices = iter(rng.integers(0, args.test_size, 2 * args.repeat).tolist())
+
+    def update():
+        main.prediction_update(next(indices))
+
+    return {
+        "cold": measure(update, args.repeat, setup=utils.sample_data_url.cache_clear),
+        "warm": measure(lambda: main.prediction_update(0), args.repeat),
+    }
+
+
+def bench_xai(args):
+    from .engine import main
+    from .engine.ml import (
+        prediction_xai_params,
+        xai_update,
+        SALIENCY_TYPES,
+        WHITE_BOX_TYPES,
+    )
+
+    main.reset_model()
+    inference_model, float_model, image, _ = prediction_xai_params(
+        main.SESSION.prediction
+    )
+
+    results = {}
+    for name in SALIENCY_TYPES:
+        model = float_model if name in WHITE_BOX_TYPES else inference_model
+
+        # No sample key so the saliency cache is bypassed
+        xai_update(model, image, name)
+        results[name] = measure(lambda: xai_update(model, image, name), args.xai_repeat)
+
+    return results
+
+
+def bench_charts(args):
+    from .engine import charts
+
+    rng = np.random.default_rng(args.seed)
+    model_state = {
+        serie: rng.random(args.chart_epochs).tolist() for serie in charts.SERIES_ALL
+    }
+    model_state["epoch"] = args.chart_epochs
+    matrix = rng.integers(0, 1000, (10, 10)).astype(np.float64)
+    prediction = rng.normal(size=10).tolist()
+
+    def training_charts():
+        charts.TRAINING_CHARTS.clear()
+        for chart in charts.acc_loss_charts(model_state):
+            chart.to_dict()
+
+    def training_charts_update():
+        for chart in charts.acc_loss_charts(model_state):
+            chart.to_dict()
+
+    return {
+        "epochs": args.chart_epochs,
+        "training_charts": measure(training_charts, args.repeat),
+        "training_charts_update": measure(training_charts_update, args.repeat),
+        "prediction_chart": measure(
+            lambda: charts.prediction_chart(prediction).to_dict(), args.repeat
+        ),
+        "confusion_matrix_chart": measure(
+            lambda: charts.confusion_matrix_chart(matrix).to_dict(), args.repeat
+        ),
+        "class_accuracy": measure(
+            lambda: charts.class_accuracy(matrix).to_dict(), args.repeat
+        ),
+    }
+
+
+BENCHMARK_FUNCTIONS = {
+    "training": bench_training,
+    "testing": bench_testing,
+    "prediction": bench_prediction,
+    "xai": bench_xai,
+    "charts": bench_charts,
+}
+
+
+# -----------------------------------------------------------------------------
+# Entry point
+# -----------------------------------------------------------------------------
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="trame-mnist-benchmark-") as data_dir:
+        write_subset(data_dir, args.source, args.train_size, args.test_size, args.seed)
+
+        # Must be set before the engine computes its paths
+        os.environ["TRAME_MNIST_DATA_DIR"] = data_dir
+
+        import torch
+
+        torch.manual_seed(args.seed)
+        if args.threads > 0:
+            torch.set_num_threads(args.threads)
+
+        if "training" not in args.benchmarks:
+            from .engine.ml.common import LeNet5, Model
+
+            Model(LeNet5()).save()
+
+        results = {}
+        for name in BENCHMARKS:
+            if name in args.benchmarks:
+                print(f"Running {name} benchmark...", file=sys.stderr)
+                results[name] = BENCHMARK_FUNCTIONS[name](args)
+
+        return {
+            "environment": environment(),
+            "parameters": {
+                "source": args.source,
+                "train_size": args.train_size,
+                "test_size": args.test_size,
+                "seed": args.seed,
+            },
+            "results": results,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the trame-mnist engine")
+    parser.add_argument("--output", help="JSON file to write (stdout by default)")
+    parser.add_argument("--source", choices=["synthetic", "mnist"], default="synthetic")
+    parser.add_argument("--train-size", type=int, default=6000)
+    parser.add_argument("--test-size", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--xai-repeat", type=int, default=3)
+    parser.add_argument("--chart-epochs", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS
+    )
+    args = parser.parse_args(argv)
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
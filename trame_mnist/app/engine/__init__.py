@@ -1,11 +1,4 @@
-from .main import (
-    initialize,
-    training_add,
-    training_reset,
-    prediction_update,
-    xai_run,
-    testing_run,
-)
+import importlib
 
 __all__ = [
     "initialize",
@@ -15,3 +8,11 @@ __all__ = [
     "xai_run",
     "testing_run",
 ]
+
+
+def __getattr__(name):
+    # Resolved on first use so processes only running the ml package (data
+    # parallel ranks) do not import trame and the application state
+    if name in __all__:
+        return getattr(importlib.import_module(".main", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,6 +2,8 @@ import altair as alt
 import pandas as pd
 import numpy as np
 
+from .ml.config import CHART_MAX_POINTS
+
 SERIES_ALL = [
     "training_accuracy",
     "training_loss",
@@ -96,9 +98,78 @@ def to_chart(model, series=SERIES_ALL, title="value", height=300, use_percent=Tr
     return source_to_chart(source, title=title, height=height, use_percent=use_percent)
 
 
+def downsample(points, max_points=CHART_MAX_POINTS):
+    """Keep the most recent half at full resolution and stride the older ones"""
+    if max_points <= 0 or len(points) <= max_points:
+        return points
+
+    recent = max(1, max_points // 2)
+    if max_points == recent:
+        return points[-recent:]
+
+    older = points[:-recent]
+    stride = -(-len(older) // (max_points - recent))
+    return older[::stride] + points[-recent:]
+
+
+class TrainingChart:
+    """Chart spec built once, with epoch points appended as training goes"""
+
+    def __init__(self, series, title="value", height=300, use_percent=True):
+        self.series = series
+        self.title = title
+        self._data_name = f"{title}_source"
+        self._spec = source_to_chart(
+            alt.NamedData(name=self._data_name),
+            title=title,
+            height=height,
+            use_percent=use_percent,
+        ).to_dict()
+        self._points = {serie: [] for serie in series}
+
+    def update(self, model_state):
+        for serie in self.series:
+            values = model_state.get(serie)
+            points = self._points[serie]
+            if len(values) < len(points) or (
+                points and points[0][self.title] != values[0]
+            ):
+                points.clear()  # Training got reset
+
+            label = serie.split("_")[0]
+            for epoch in range(len(points), len(values)):
+                points.append(
+                    {
+                        "Serie": label,
+                        "epoch": epoch + 1,
+                        f"{self.title}": values[epoch],
+                    }
+                )
+
+        return self
+
+    def to_dict(self):
+        values = []
+        for serie in self.series:
+            values.extend(downsample(self._points[serie]))
+
+        return {**self._spec, "datasets": {self._data_name: values}}
+
+
+TRAINING_CHARTS = {}
+
+
 def acc_loss_charts(model_state):
-    acc = to_chart(model_state, series=SERIES_ACC, title="Accuracy", use_percent=True)
-    loss = to_chart(model_state, series=SERIES_LOSS, title="Loss", use_percent=False)
+    if not TRAINING_CHARTS:
+        TRAINING_CHARTS["acc"] = TrainingChart(
+            SERIES_ACC, title="Accuracy", use_percent=True
+        )
+        TRAINING_CHARTS["loss"] = TrainingChart(
+            SERIES_LOSS, title="Loss", use_percent=False
+        )
+
+    acc = TRAINING_CHARTS["acc"].update(model_state)
+    loss = TRAINING_CHARTS["loss"].update(model_state)
     return acc, loss
 
 
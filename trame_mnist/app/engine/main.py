@@ -1,18 +1,33 @@
-import numpy as np
-import base64
+import time
 import asyncio
-from pathlib import Path
 
-import multiprocessing
 from functools import partial
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
-from . import ml, utils, charts
+IMPORT_START = time.perf_counter()
+
+from . import ml, utils
 from trame import state, controller as ctrl
 
-MULTI_PROCESS_MANAGER = None
-PROCESS_EXECUTOR = None
-PENDING_TASKS = []
+IMPORT_END = time.perf_counter()
+
+PROGRESS_CHANNEL = None
+TRAINING_WORKER = None
+XAI_EXECUTOR = None
+
+
+class Session:
+    """Mutable engine state of the session served by this process"""
+
+    def __init__(self):
+        self.prediction = ml.PredictionContext()
+        self.pending_tasks = []
+        self.xai_tasks = []
+        self.xai_results = {}
+        self.xai_generation = 0
+
+
+SESSION = Session()
 
 # -----------------------------------------------------------------------------
 # Initial state
@@ -27,6 +42,12 @@ TRAINING_INITIAL_STATE = {
         "validation_accuracy": [],
         "validation_loss": [],
     },
+    "training_progress": {
+        "epoch": 0,
+        "fraction": 0,
+        "samples_per_second": 0,
+        "loss": 0,
+    },
     "xai_results": [],
 }
 
@@ -34,6 +55,12 @@ state.update(
     {
         **TRAINING_INITIAL_STATE,
         "training_running": False,
+        "training_processes": ml.TRAINING_PROCESSES,
+        "testing_metrics": {},
+        "engine_metrics": {},
+        "checkpoint_epochs": [],
+        "prediction_epoch": 0,
+        "training_metrics": {},
         "prediction_success": False,
         "prediction_available": False,
     }
@@ -41,9 +68,14 @@ state.update(
 
 
 def initialize(**kwargs):
-    global MULTI_PROCESS_MANAGER, PROCESS_EXECUTOR
-    MULTI_PROCESS_MANAGER = multiprocessing.Manager()
-    PROCESS_EXECUTOR = ProcessPoolExecutor(1)
+    global PROGRESS_CHANNEL, TRAINING_WORKER, XAI_EXECUTOR
+    initialize_start = time.perf_counter()
+    PROGRESS_CHANNEL = utils.ProgressChannel()
+    PROGRESS_CHANNEL.attach(asyncio.get_event_loop())
+    _start_training_worker()
+    ml.RESOURCES.on_change(_apply_allocation)
+    XAI_EXECUTOR = ThreadPoolExecutor(len(ml.SALIENCY_TYPES))
+    asyncio.get_event_loop().run_in_executor(None, utils.prebuild_data_urls)
 
     if ml.has_trained_model() and state.epoch_end == 0:
         # Just load existing state
@@ -52,6 +84,26 @@ def initialize(**kwargs):
     reset_model()
     prediction_update()
 
+    utils.startup_report(
+        {
+            "engine_import": IMPORT_END - IMPORT_START,
+            "initialize": time.perf_counter() - initialize_start,
+            "ready": time.perf_counter() - IMPORT_START,
+        }
+    )
+
+
+def _start_training_worker():
+    global TRAINING_WORKER
+    writer = PROGRESS_CHANNEL.open_writer()
+    TRAINING_WORKER = ml.TrainingWorker(writer)
+    writer.close()
+
+
+def _apply_allocation(allocation):
+    # 0 lets the worker keep its threads while it is not training
+    TRAINING_WORKER.threads.set(allocation.get("training", 0))
+
 
 # -----------------------------------------------------------------------------
 # Methods to bound to UI
@@ -62,23 +114,26 @@ state.epoch_increase = 2  # we need a minimum of 2 points to plot progress
 
 async def training_add():
     """Add 10 epoch to current training"""
-    await asyncio.gather(*PENDING_TASKS)
-    PENDING_TASKS.clear()
+    await asyncio.gather(*SESSION.pending_tasks)
+    SESSION.pending_tasks.clear()
 
     if state.model_state.get("epoch") >= state.epoch_end:
         state.epoch_end += state.epoch_increase
 
-    loop = asyncio.get_event_loop()
-    queue = MULTI_PROCESS_MANAGER.Queue()
+    if not TRAINING_WORKER.is_alive():
+        _start_training_worker()  # Previous one died
 
-    task_training = loop.run_in_executor(
-        PROCESS_EXECUTOR,
-        partial(ml.training_add, queue, state.epoch_end),
+    loop = asyncio.get_event_loop()
+    stopped = PROGRESS_CHANNEL.expect_stop()
+    ml.RESOURCES.start("training")
+    TRAINING_WORKER.train(state.epoch_end, state.training_processes)
+    task_monitor = loop.create_task(
+        utils.progress_to_state(stopped, SESSION.prediction)
     )
-    task_monitor = loop.create_task(utils.queue_to_state(queue, task_training))
+    task_monitor.add_done_callback(lambda _: ml.RESOURCES.stop("training"))
 
     # Only join on monitor task
-    PENDING_TASKS.append(task_monitor)
+    SESSION.pending_tasks.append(task_monitor)
 
     reset_model()
 
@@ -89,6 +144,7 @@ async def training_add():
 def training_reset():
     """Remove saved model and reset local state"""
     ml.delete_model()
+    TRAINING_WORKER.reset()
     state.update(TRAINING_INITIAL_STATE)
     reset_model()
 
@@ -96,18 +152,21 @@ def training_reset():
 # -----------------------------------------------------------------------------
 
 
-def prediction_update():
-    image, label, prediction = ml.prediction_update()
+def prediction_update(index=None):
+    from . import charts
 
-    image_path = Path(f"{ml.DATA_DIR}/{label}.jpg")
-    image.save(image_path)
-    with open(image_path, "rb") as file:
-        data = base64.encodebytes(file.read()).decode("utf-8")
-        state.prediction_input_url = f"data:image/jpeg;base64,{data}"
+    with ml.instrument("prediction_update"):
+        index, _, label, prediction = ml.prediction_update(index, SESSION.prediction)
 
-    state.prediction_label = label
-    state.prediction_success = max(prediction) == prediction[label]
-    ctrl.chart_pred_update(charts.prediction_chart(prediction))
+        state.prediction_input_url = utils.sample_data_url(index)
+
+        state.prediction_label = label
+        state.prediction_success = max(prediction) == prediction[label]
+
+        with ml.instrument("chart_prediction"):
+            ctrl.chart_pred_update(charts.prediction_chart(prediction))
+
+    utils.metrics_to_state()
 
     if state.xai_viz:
         xai_run()
@@ -118,46 +177,122 @@ def prediction_update():
 
 def _prediction_next_failure():
     with state.monitor():
-        prediction_update()
-        if not state.prediction_success:
-            state.prediction_search_failure = False
-
-    if state.prediction_success and state.prediction_search_failure:
-        loop = asyncio.get_event_loop()
-        loop.call_later(0.01, _prediction_next_failure)
+        index = ml.prediction_next_failure(
+            state.prediction_failure_lowest_confidence, SESSION.prediction
+        )
+        if index is not None:
+            prediction_update(index)
+        state.prediction_search_failure = False
 
 
 # -----------------------------------------------------------------------------
 
 
+def _xai_compute(model, image, xai_method, sample_key, generation, on_update):
+    # Counted while this thread computes, even once the task got cancelled
+    with ml.RESOURCES.activity("xai"):
+        result = ml.xai_update(
+            model,
+            image,
+            xai_method,
+            sample_key,
+            lambda partial_result: on_update(utils.heatmaps_to_state(partial_result)),
+            lambda: generation != SESSION.xai_generation,
+        )
+    if result is None:
+        return None  # Superseded while running
+
+    return utils.heatmaps_to_state(result)
+
+
+def _xai_show(xai_method, heatmaps):
+    results = SESSION.xai_results
+    results[xai_method] = heatmaps
+    with state.monitor():
+        state.xai_results = {
+            name: results[name] for name in ml.SALIENCY_TYPES if name in results
+        }
+        utils.metrics_to_state()
+
+
+def _xai_publish(xai_method, task):
+    if (
+        task not in SESSION.xai_tasks
+        or task.cancelled()
+        or task.exception() is not None
+    ):
+        return  # Superseded or failed
+
+    _xai_show(xai_method, task.result())
+
+
+def _xai_publish_partial(xai_method, generation, heatmaps):
+    if generation == SESSION.xai_generation:
+        _xai_show(xai_method, heatmaps)
+
+
 def xai_run():
+    for task in SESSION.xai_tasks:
+        task.cancel()
+    SESSION.xai_tasks.clear()
+    SESSION.xai_results.clear()
+    SESSION.xai_generation += 1
+
     try:
-        results = {}
-        model, image = ml.prediction_xai_params()
-        for xai_method in ml.SALIENCY_TYPES:
-            result = ml.xai_update(model, image, xai_method)
-            heatmaps = {}
-            data_range = [float(np.amin(result)), float(np.amax(result))]
-            for i in range(10):
-                heatmaps[f"{i}"] = result[i].ravel().tolist()
-            results[xai_method] = {"heatmaps": heatmaps, "range": data_range}
-
-        state.xai_results = results
+        inference_model, model, image, sample_key = ml.prediction_xai_params(
+            SESSION.prediction
+        )
     except Exception:
-        pass  # Model is not available...
+        return  # Model is not available...
+
+    if XAI_EXECUTOR is None:
+        return
+
+    state.xai_results = {}
+    loop = asyncio.get_event_loop()
+    for xai_method in ml.SALIENCY_TYPES:
+        xai_model = model if xai_method in ml.WHITE_BOX_TYPES else inference_model
+        on_update = partial(
+            loop.call_soon_threadsafe,
+            _xai_publish_partial,
+            xai_method,
+            SESSION.xai_generation,
+        )
+        task = loop.run_in_executor(
+            XAI_EXECUTOR,
+            partial(
+                _xai_compute,
+                xai_model,
+                image,
+                xai_method,
+                sample_key,
+                SESSION.xai_generation,
+                on_update,
+            ),
+        )
+        task.add_done_callback(partial(_xai_publish, xai_method))
+        SESSION.xai_tasks.append(task)
 
 
 # -----------------------------------------------------------------------------
 
 
 def _testing_running():
-    with state.monitor():
-        matrix, sample_size = ml.testing_run()
-        ctrl.chart_confusion_matrix(charts.confusion_matrix_chart(matrix))
-        ctrl.chart_class_accuracy(charts.class_accuracy(matrix))
-
+    from . import charts
+
+    with state.monitor(), ml.RESOURCES.activity("testing"):
+        matrix, sample_size, metrics = ml.testing_run(
+            model=SESSION.prediction.model,
+            fingerprint=SESSION.prediction.fingerprint,
+        )
+        with ml.instrument("chart_testing"):
+            ctrl.chart_confusion_matrix(charts.confusion_matrix_chart(matrix))
+            ctrl.chart_class_accuracy(charts.class_accuracy(matrix))
+
+        state.testing_metrics = metrics
         state.testing_count = sample_size
         state.testing_running = False
+        utils.metrics_to_state()
 
 
 # -----------------------------------------------------------------------------
@@ -173,7 +308,9 @@ def testing_run():
 
 
 def reset_model():
-    state.prediction_available = ml.prediction_reload()
+    state.prediction_available = ml.prediction_reload(SESSION.prediction)
+    state.checkpoint_epochs = ml.checkpoint_epochs()
+    state.prediction_epoch = SESSION.prediction.epoch or 0
     state.testing_count = 0
 
 
@@ -184,9 +321,26 @@ def reset_model():
 
 @state.change("model_state")
 def update_charts(model_state, **kwargs):
-    acc, loss = charts.acc_loss_charts(model_state)
-    ctrl.chart_acc_update(acc)
-    ctrl.chart_loss_update(loss)
+    from . import charts
+
+    with ml.instrument("chart_training"):
+        acc, loss = charts.acc_loss_charts(model_state)
+        ctrl.chart_acc_update(acc)
+        ctrl.chart_loss_update(loss)
+
+    utils.metrics_to_state()
+
+
+@state.change("prediction_epoch")
+def select_epoch(prediction_epoch, **kwargs):
+    if (prediction_epoch or None) == SESSION.prediction.epoch:
+        return
+
+    # Compare the same sample across epochs
+    index = SESSION.prediction.last_index
+    SESSION.prediction.epoch = prediction_epoch or None
+    reset_model()
+    prediction_update(index)
 
 
 @state.change("xai_viz_color_min", "xai_viz_color_max")
@@ -1,18 +1,40 @@
 from .common import has_trained_model, delete_model, DATA_DIR
-from .training import training_add
-from .prediction import prediction_reload, prediction_update, prediction_xai_params
-from .xai import xai_update, SALIENCY_TYPES
+from .checkpoints import checkpoint_epochs
+from .config import TRAINING_PROCESSES
+from .worker import TrainingWorker
+from .prediction import (
+    PredictionContext,
+    prediction_reload,
+    prediction_update,
+    prediction_next_failure,
+    prediction_sample_count,
+    prediction_image,
+    prediction_xai_params,
+)
+from .xai import xai_update, SALIENCY_TYPES, WHITE_BOX_TYPES
 from .testing import testing_run
+from .metrics import instrument, metrics_message
+from .resources import RESOURCES
 
 __all__ = [
     "DATA_DIR",
+    "TRAINING_PROCESSES",
     "has_trained_model",
     "delete_model",
-    "training_add",
+    "checkpoint_epochs",
+    "TrainingWorker",
+    "PredictionContext",
     "prediction_reload",
     "prediction_update",
+    "prediction_next_failure",
+    "prediction_sample_count",
+    "prediction_image",
     "prediction_xai_params",
     "xai_update",
     "SALIENCY_TYPES",
+    "WHITE_BOX_TYPES",
     "testing_run",
+    "instrument",
+    "metrics_message",
+    "RESOURCES",
 ]
@@ -0,0 +1,128 @@
+import os
+import json
+import queue
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .common import CHECKPOINT_DIR, LeNet5
+
+# -----------------------------------------------------------------------------
+# Flat float32 weights format, memory mappable with numpy
+# -----------------------------------------------------------------------------
+
+
+def write_weights(path, state_dict):
+    """Atomically write a state_dict as a flat .npy and return its sha1"""
+    flat = torch.cat([tensor.reshape(-1).float() for tensor in state_dict.values()])
+    flat = flat.numpy()
+
+    # Unique name as several processes may export the same checkpoint
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        np.save(file, flat)
+    os.replace(tmp_path, path)
+
+    return hashlib.sha1(flat.tobytes()).hexdigest()
+
+
+def map_weights(path, module=None):
+    """LeNet5 whose parameters are views of a flat weights file"""
+    module = LeNet5() if module is None else module
+
+    # Copy on write mapping: pages stay shared as nothing writes to them
+    flat = torch.from_numpy(np.load(path, mmap_mode="c"))
+
+    offset = 0
+    for name, tensor in module.state_dict().items():
+        size = tensor.numel()
+        view = flat[offset : offset + size].view(tensor.shape)
+        offset += size
+
+        owner_name, _, attribute = name.rpartition(".")
+        owner = module.get_submodule(owner_name) if owner_name else module
+        setattr(owner, attribute, nn.Parameter(view, requires_grad=False))
+
+    return module.eval()
+
+
+# -----------------------------------------------------------------------------
+# Per-epoch snapshots
+# -----------------------------------------------------------------------------
+
+
+def epoch_weights_path(epoch):
+    return Path(CHECKPOINT_DIR, f"epoch-{epoch:04d}.npy")
+
+
+def epoch_metadata_path(epoch):
+    return Path(CHECKPOINT_DIR, f"epoch-{epoch:04d}.json")
+
+
+def save_epoch(state_dict, metadata):
+    """Write the snapshot of an epoch, its metadata last so it commits it"""
+    epoch = metadata["epoch"]
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+    fingerprint = write_weights(epoch_weights_path(epoch), state_dict)
+
+    path = epoch_metadata_path(epoch)
+    tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps({**metadata, "fingerprint": fingerprint}))
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """Background thread writing epoch snapshots in submission order"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for state_dict, metadata in iter(self._queue.get, None):
+            try:
+                save_epoch(state_dict, metadata)
+            except Exception as error:
+                print(f"Could not save epoch {metadata['epoch']}: {error}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, model):
+        """Snapshot a Model, copying its weights so training can go on"""
+        state_dict = {
+            name: tensor.detach().clone()
+            for name, tensor in model.model.state_dict().items()
+        }
+        metadata = json.loads(json.dumps(model.metadata))
+        self._queue.put((state_dict, metadata))
+
+    def wait(self):
+        self._queue.join()
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+def checkpoint_info(epoch):
+    """Metadata of an epoch snapshot or None if it was not written"""
+    path = epoch_metadata_path(epoch)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def checkpoint_epochs():
+    if not CHECKPOINT_DIR.exists():
+        return []
+    return sorted(int(path.stem[6:]) for path in CHECKPOINT_DIR.glob("epoch-*.json"))
+
+
+def checkpoint_fingerprints():
+    return {checkpoint_info(epoch)["fingerprint"] for epoch in checkpoint_epochs()}
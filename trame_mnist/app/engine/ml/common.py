@@ -1,24 +1,58 @@
 import os
+import shutil
+import hashlib
 from pathlib import Path
 
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
 import numpy as np
 
+from . import config
+
 # -----------------------------------------------------------------------------
 # Globals
 # -----------------------------------------------------------------------------
 
 DATA_DIR = str(
-    Path(Path(__file__).parent.parent.parent.parent, "data").resolve().absolute()
+    Path(config.DATA_DIR or Path(Path(__file__).parent.parent.parent.parent, "data"))
+    .resolve()
+    .absolute()
 )
 
 MODEL_PATH = Path(DATA_DIR, "model_lenet-5.trained").resolve().absolute()
+CHECKPOINT_DIR = Path(DATA_DIR, "checkpoints").resolve().absolute()
+
+NORMALIZE_MEAN = 0.0
+NORMALIZE_STD = 1.0
+
+
+def images_to_tensor(images):
+    """Normalized NCHW float tensor of a stack of HxW (or HxWxC) images"""
+    if torch.is_tensor(images):
+        is_byte = images.dtype == torch.uint8
+        tensor = images.to(torch.float32, copy=True)
+    else:
+        images = np.asarray(images)
+        is_byte = images.dtype == np.uint8
+        tensor = torch.tensor(images, dtype=torch.float32)
+
+    if is_byte:
+        tensor.div_(255)
+
+    if tensor.ndim == 3:
+        tensor = tensor.unsqueeze(1)
+    elif tensor.ndim == 4:
+        tensor = tensor.permute(0, 3, 1, 2)
+
+    return tensor.sub_(NORMALIZE_MEAN).div_(NORMALIZE_STD)
+
+
+def maxabs_scale(maps):
+    """Scale each class map to [-1, 1] by its largest magnitude, as xaitk does"""
+    scale = np.abs(maps).reshape(maps.shape[0], -1).max(1)
+    scale[scale == 0] = 1
+    return np.clip(maps / scale[:, None, None], -1, 1).astype(np.float32)
 
-TRANSFORM = transforms.Compose(
-    [transforms.ToTensor(), transforms.Normalize((0,), (1,))]
-)
 
 # -----------------------------------------------------------------------------
 
@@ -81,11 +115,11 @@ class Model:
         acc = torch.sum(output == target) / output.shape[0]
         return float(acc)
 
-    def train_step(self, dataset):
+    def train_step(self, dataset, on_batch=None):
         self.model.train()
         batch_loss = []
         batch_acc = []
-        for inputs, targets in dataset:
+        for index, (inputs, targets) in enumerate(dataset):
             outputs = self.model(inputs)
 
             loss = self.loss(outputs, targets)
@@ -94,6 +128,9 @@ class Model:
             batch_loss.append(loss.item())
             batch_acc.append(self.batch_accuracy(outputs, targets))
 
+            if on_batch is not None:
+                on_batch(index, targets.shape[0], batch_loss[-1])
+
         self.train_loss.append(float(np.mean(batch_loss)))
         self.train_acc.append(float(np.mean(batch_acc)))
 
@@ -119,17 +156,11 @@ class Model:
             self.model.eval()
 
     def save(self, output_path=MODEL_PATH):
-        data = {
-            "state_dict": self.model.state_dict(),
-            "metadata": self.metadata,
-        }
-        torch.save(data, output_path)
+        save_checkpoint(self.model.state_dict(), self.metadata, output_path)
 
     def predict(self, image):
         self.model.eval()
-        tensor = TRANSFORM(image)
-        tensor = torch.reshape(tensor, (1, *tensor.shape))
-        return self.model(tensor)
+        return self.model(images_to_tensor(np.asarray(image)[None]))
 
     @property
     def metadata(self):
@@ -155,6 +186,17 @@ class Model:
 # -----------------------------------------------------------------------------
 
 
+def save_checkpoint(state_dict, metadata, output_path=MODEL_PATH):
+    """Atomically replace the checkpoint so readers never see a partial file"""
+    data = {
+        "state_dict": state_dict,
+        "metadata": metadata,
+    }
+    tmp_path = Path(f"{output_path}.tmp")
+    torch.save(data, tmp_path)
+    os.replace(tmp_path, output_path)
+
+
 def get_model(learning_rate=1e-5):
     lenet5 = LeNet5()
     model = Model(lenet5, learning_rate)
@@ -165,7 +207,14 @@ def get_model(learning_rate=1e-5):
 def delete_model():
     if MODEL_PATH.exists():
         os.remove(MODEL_PATH)
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
 
 
 def has_trained_model():
     return MODEL_PATH.exists()
+
+
+def model_fingerprint(model_path=MODEL_PATH):
+    if not Path(model_path).exists():
+        return None
+    return hashlib.sha1(Path(model_path).read_bytes()).hexdigest()
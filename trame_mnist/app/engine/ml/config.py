@@ -0,0 +1,39 @@
+import os
+
+# -----------------------------------------------------------------------------
+# Deployment settings (overridable with TRAME_MNIST_* environment variables)
+# -----------------------------------------------------------------------------
+
+
+def _env(name, default, cast=str):
+    value = os.environ.get(f"TRAME_MNIST_{name}")
+    if value is None:
+        return default
+    return cast(value)
+
+
+def _bool(value):
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+DATA_DIR = _env("DATA_DIR", None)
+XAI_CACHE_SIZE_MB = _env("XAI_CACHE_SIZE_MB", 64, float)
+TRAINING_PROGRESS_RATE = _env("TRAINING_PROGRESS_RATE", 4, float)
+IMAGE_CACHE_SIZE = _env("IMAGE_CACHE_SIZE", 1024, int)
+IMAGE_CACHE_PREBUILD = _env("IMAGE_CACHE_PREBUILD", False, _bool)
+XAI_HEATMAP_ENCODING = _env("XAI_HEATMAP_ENCODING", "uint8")
+CHART_MAX_POINTS = _env("CHART_MAX_POINTS", 500, int)
+PREDICTION_STORE_DTYPE = _env("PREDICTION_STORE_DTYPE", "float32")
+TRAINING_PROCESSES = _env("TRAINING_PROCESSES", 1, int)
+TRAINING_THREADS = _env("TRAINING_THREADS", 0, int)
+INFERENCE_MODE = _env("INFERENCE_MODE", "float32")
+INFERENCE_BACKEND = _env("INFERENCE_BACKEND", "eager")
+INSTRUMENTATION = _env("INSTRUMENTATION", False, _bool)
+PROFILER_TRACE_DIR = _env("PROFILER_TRACE_DIR", None)
+XAI_RISE_PROGRESSIVE = _env("XAI_RISE_PROGRESSIVE", True, _bool)
+XAI_RISE_CHUNK = _env("XAI_RISE_CHUNK", 25, int)
+XAI_RISE_TOLERANCE = _env("XAI_RISE_TOLERANCE", 0.0, float)
+XAI_OCCLUSION_ADAPTIVE = _env("XAI_OCCLUSION_ADAPTIVE", True, _bool)
+XAI_OCCLUSION_THRESHOLD = _env("XAI_OCCLUSION_THRESHOLD", 0.1, float)
+CPU_BUDGET = _env("CPU_BUDGET", 0, int)
+TESTING_BATCH_SIZE = _env("TESTING_BATCH_SIZE", 2048, int)
@@ -0,0 +1,163 @@
+import os
+import gzip
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .common import DATA_DIR, images_to_tensor
+
+# -----------------------------------------------------------------------------
+# Globals
+# -----------------------------------------------------------------------------
+
+RAW_DIR = Path(DATA_DIR, "MNIST", "raw")
+CACHE_DIR = Path(DATA_DIR, "MNIST", "cache")
+
+SPLITS = {
+    "train": ("train-images-idx3-ubyte", "train-labels-idx1-ubyte"),
+    "test": ("t10k-images-idx3-ubyte", "t10k-labels-idx1-ubyte"),
+}
+
+IDX_TYPES = {
+    0x08: np.dtype(np.uint8),
+    0x09: np.dtype(np.int8),
+    0x0B: np.dtype(">i2"),
+    0x0C: np.dtype(">i4"),
+    0x0D: np.dtype(">f4"),
+    0x0E: np.dtype(">f8"),
+}
+
+DATASETS = {}
+DATASETS_LOCK = threading.Lock()
+
+# -----------------------------------------------------------------------------
+# IDX decoding and on-disk cache
+# -----------------------------------------------------------------------------
+
+
+def read_idx(path):
+    path = Path(path)
+    if path.exists():
+        content = path.read_bytes()
+    else:
+        with gzip.open(f"{path}.gz", "rb") as file:
+            content = file.read()
+
+    dtype = IDX_TYPES[content[2]]
+    ndim = content[3]
+    shape = np.frombuffer(content, dtype=">i4", count=ndim, offset=4)
+    data = np.frombuffer(content, dtype=dtype, offset=4 + 4 * ndim)
+    return data.reshape(tuple(shape)).astype(dtype.newbyteorder("="))
+
+
+def _raw_available(split):
+    return all(
+        Path(RAW_DIR, name).exists() or Path(RAW_DIR, f"{name}.gz").exists()
+        for name in SPLITS[split]
+    )
+
+
+def _save_npy(path, array):
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as file:
+        np.save(file, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def build_cache(split):
+    """Decode the IDX files of a split once into .npy files"""
+    if not _raw_available(split):
+        import torchvision
+
+        torchvision.datasets.MNIST(
+            root=DATA_DIR, train=(split == "train"), download=True
+        )
+
+    images_name, labels_name = SPLITS[split]
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _save_npy(Path(CACHE_DIR, f"{split}-images.npy"), read_idx(RAW_DIR / images_name))
+    _save_npy(
+        Path(CACHE_DIR, f"{split}-labels.npy"),
+        read_idx(RAW_DIR / labels_name).astype(np.int64),
+    )
+
+
+def load_cache(split):
+    images_path = Path(CACHE_DIR, f"{split}-images.npy")
+    labels_path = Path(CACHE_DIR, f"{split}-labels.npy")
+    if not images_path.exists() or not labels_path.exists():
+        build_cache(split)
+
+    # Copy on write mappings: processes share the pages as nothing writes to them
+    return (
+        np.load(images_path, mmap_mode="c"),
+        np.load(labels_path, mmap_mode="c"),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Tensor resident dataset and loader
+# -----------------------------------------------------------------------------
+
+
+class MnistCache:
+    """Full MNIST split as uint8 tensors mapped from the on-disk cache"""
+
+    def __init__(self, split):
+        images, labels = load_cache(split)
+        self.split = split
+        self.images = torch.from_numpy(images)
+        self.labels = torch.from_numpy(labels)
+
+    def __len__(self):
+        return self.labels.shape[0]
+
+    def image(self, index):
+        return Image.fromarray(self.images[index].numpy(), mode="L")
+
+    def label(self, index):
+        return int(self.labels[index])
+
+    def batch(self, indices):
+        return (
+            images_to_tensor(self.images[indices]),
+            self.labels[indices],
+        )
+
+
+class BatchLoader:
+    """Slice (optionally shuffled) index permutations out of a MnistCache"""
+
+    def __init__(self, dataset, indices=None, batch_size=32, shuffle=False):
+        self.dataset = dataset
+        self.indices = torch.arange(len(dataset)) if indices is None else indices
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return (len(self.indices) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        indices = self.indices
+        if self.shuffle:
+            indices = indices[torch.randperm(len(indices))]
+
+        for start in range(0, len(indices), self.batch_size):
+            yield self.dataset.batch(indices[start : start + self.batch_size])
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+def get_dataset(train=False):
+    """Split shared by the whole engine, loaded on first use"""
+    split = "train" if train else "test"
+    with DATASETS_LOCK:
+        if split not in DATASETS:
+            DATASETS[split] = MnistCache(split)
+        return DATASETS[split]
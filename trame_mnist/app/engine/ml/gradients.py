@@ -0,0 +1,105 @@
+import json
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .common import images_to_tensor, maxabs_scale
+
+INTEGRATED_GRADIENTS_STEPS = 32
+
+# -----------------------------------------------------------------------------
+# Class maps of the 10 labels, each computed on one copy of the input
+# -----------------------------------------------------------------------------
+
+
+def _class_inputs(input, count=10):
+    return images_to_tensor(np.asarray(input)[None]).repeat(count, 1, 1, 1)
+
+
+def _target_logits(logits):
+    """Sum of the logit of each class on its own copy of the input"""
+    classes = torch.arange(10).repeat(logits.shape[0] // 10)
+    return logits.gather(1, classes[:, None]).sum()
+
+
+def vanilla_gradient(model, input):
+    inputs = _class_inputs(input).requires_grad_()
+    (grads,) = torch.autograd.grad(_target_logits(model(inputs)), inputs)
+    return grads[:, 0], inputs.shape[0]
+
+
+def integrated_gradients(model, input, steps=INTEGRATED_GRADIENTS_STEPS):
+    """Path integral of the gradients from a black image to the input"""
+    inputs = _class_inputs(input)
+    baseline = _class_inputs(np.zeros_like(input))
+    alphas = (torch.arange(steps, dtype=torch.float32) + 0.5) / steps
+
+    path = baseline + alphas[:, None, None, None, None] * (inputs - baseline)
+    path = path.reshape(-1, *inputs.shape[1:]).requires_grad_()
+    (grads,) = torch.autograd.grad(_target_logits(model(path)), path)
+
+    average = grads.reshape(steps, *inputs.shape).mean(0)
+    return (average * (inputs - baseline))[:, 0], path.shape[0]
+
+
+def grad_cam(model, input):
+    """
+    Gradient weighted activations of the LeNet5 c2 convolution, mirroring
+    LeNet5.forward so the shared model needs no (thread unsafe) hooks. The
+    c3 activations are 1x1, so they carry no spatial information.
+    """
+    x = _class_inputs(input).requires_grad_()
+    x = model.relu(model.max_pool(model.c1(x)))
+    x = model.c2(x)
+    activations = x
+    x = model.relu(model.c3(model.relu(model.max_pool(x))))
+    logits = model.fc2(model.relu(model.fc1(torch.flatten(x, 1))))
+
+    (grads,) = torch.autograd.grad(_target_logits(logits), activations)
+    weights = grads.mean((2, 3), keepdim=True)
+    cam = F.relu((weights * activations).sum(1, keepdim=True))
+
+    # c2 (10x10) sees the 14x14 pooled map without padding
+    border = (14 - cam.shape[-1]) // 2
+    cam = F.pad(cam, [border] * 4)
+    cam = F.interpolate(cam, size=(28, 28), mode="bilinear", align_corners=False)
+    return cam[:, 0], 10
+
+
+GRADIENT_METHODS = {
+    "vanilla": vanilla_gradient,
+    "integrated": integrated_gradients,
+    "gradcam": grad_cam,
+}
+
+
+class GradientSaliency:
+    """White-box saliency of the 10 classes using batched autograd"""
+
+    def __init__(self, method, **options):
+        self._method = method
+        self._options = options
+
+    @property
+    def parameters(self):
+        return json.dumps({"method": self._method, **self._options}, sort_keys=True)
+
+    def run(self, input, model):
+        """Class maps each scaled to [-1, 1] with the number of images classified"""
+        with torch.enable_grad():
+            maps, classified = GRADIENT_METHODS[self._method](
+                model, input, **self._options
+            )
+
+        return maxabs_scale(maps.detach().numpy()), classified
+
+
+def create_gradient_instances():
+    return {
+        "Gradient": GradientSaliency("vanilla"),
+        "IntegratedGradients": GradientSaliency(
+            "integrated", steps=INTEGRATED_GRADIENTS_STEPS
+        ),
+        "GradCAM": GradientSaliency("gradcam"),
+    }
@@ -0,0 +1,149 @@
+import io
+import copy
+
+import torch
+import torch.nn as nn
+
+from .config import INFERENCE_MODE, INFERENCE_BACKEND
+from .dataset import get_dataset
+
+INFERENCE_MODES = ["float32", "dynamic_int8", "static_int8", "bfloat16"]
+INFERENCE_BACKENDS = ["eager", "torchscript", "onnxruntime"]
+
+WARMUP_BATCH_SIZES = [1, 256]
+
+CALIBRATION_SIZE = 1024
+
+# -----------------------------------------------------------------------------
+
+
+class QuantizableLeNet5(nn.Module):
+    """LeNet5 with the stubs eager static quantization needs"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.quant = torch.quantization.QuantStub()
+        self.model = model
+        self.dequant = torch.quantization.DeQuantStub()
+
+    def forward(self, img):
+        return self.dequant(self.model(self.quant(img)))
+
+
+class CastLeNet5(nn.Module):
+    """Run LeNet5 in a reduced precision while keeping float32 inputs/outputs"""
+
+    def __init__(self, model, dtype):
+        super().__init__()
+        self.dtype = dtype
+        self.model = model.to(dtype)
+
+    def forward(self, img):
+        return self.model(img.to(self.dtype)).float()
+
+
+class OnnxRuntimeLeNet5:
+    """ONNX Runtime session exposing the module calls used by the engine"""
+
+    def __init__(self, model):
+        import onnxruntime
+
+        buffer = io.BytesIO()
+        torch.onnx.export(
+            model,
+            torch.zeros(1, 1, 28, 28),
+            buffer,
+            input_names=["img"],
+            output_names=["logits"],
+            dynamic_axes={"img": {0: "batch"}, "logits": {0: "batch"}},
+        )
+        self.session = onnxruntime.InferenceSession(
+            buffer.getvalue(), providers=["CPUExecutionProvider"]
+        )
+
+    def eval(self):
+        return self
+
+    def __call__(self, img):
+        logits = self.session.run(None, {"img": img.detach().contiguous().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+@torch.no_grad()
+def _torchscript(model):
+    traced = torch.jit.trace(model, torch.zeros(1, 1, 28, 28))
+    return torch.jit.freeze(traced.eval())
+
+
+@torch.no_grad()
+def _warmup(model):
+    for batch_size in WARMUP_BATCH_SIZES:
+        model(torch.zeros(batch_size, 1, 28, 28))
+
+
+def _quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    return "fbgemm" if "fbgemm" in engines else "qnnpack"
+
+
+@torch.no_grad()
+def _static_int8(model):
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+
+    wrapped = QuantizableLeNet5(model)
+    wrapped.eval()
+    wrapped.qconfig = torch.quantization.get_default_qconfig(engine)
+    torch.quantization.prepare(wrapped, inplace=True)
+
+    # Calibrate activation ranges on training samples
+    inputs, _ = get_dataset(train=True).batch(torch.arange(CALIBRATION_SIZE))
+    wrapped(inputs)
+
+    return torch.quantization.convert(wrapped, inplace=True)
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+def inference_model(model, mode=INFERENCE_MODE):
+    """Copy of a trained LeNet5 prepared for the given inference mode"""
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode {mode}, use one of {INFERENCE_MODES}")
+
+    if mode == "float32":
+        return model.eval()
+
+    model = copy.deepcopy(model).eval()
+    if mode == "dynamic_int8":
+        torch.backends.quantized.engine = _quantized_engine()
+        return torch.quantization.quantize_dynamic(model, {nn.Linear}, torch.qint8)
+
+    if mode == "static_int8":
+        return _static_int8(model)
+
+    return CastLeNet5(model, torch.bfloat16).eval()
+
+
+def compiled_model(model, backend=INFERENCE_BACKEND):
+    """Warmed up inference model for a backend, falling back to eager"""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend {backend}, use one of {INFERENCE_BACKENDS}"
+        )
+
+    if backend != "eager":
+        try:
+            if backend == "torchscript":
+                compiled = _torchscript(model)
+            else:
+                compiled = OnnxRuntimeLeNet5(model)
+            _warmup(compiled)
+            return compiled
+        except Exception as error:
+            print(f"Inference backend {backend} not available, using eager: {error}")
+
+    _warmup(model)
+    return model
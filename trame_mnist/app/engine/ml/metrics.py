@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from .config import INSTRUMENTATION, PROFILER_TRACE_DIR
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes (None if unknown)"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageMetrics:
+    """Call count and timings of each instrumented stage"""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, **extra):
+        with self._lock:
+            entry = self._stages.setdefault(
+                stage, {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            entry["count"] += 1
+            entry["last"] = seconds
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["peak_rss"] = peak_rss()
+            entry.update(extra)
+
+    def to_dict(self):
+        with self._lock:
+            return {stage: dict(entry) for stage, entry in self._stages.items()}
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+METRICS = StageMetrics()
+
+PROFILER_LOCK = threading.Lock()
+PROFILER_COUNT = 0
+
+# -----------------------------------------------------------------------------
+# torch.profiler traces
+# -----------------------------------------------------------------------------
+
+
+@contextmanager
+def _profiled(stage):
+    global PROFILER_COUNT
+
+    # Profilers can not overlap so concurrent stages are not traced
+    if PROFILER_TRACE_DIR is None or not PROFILER_LOCK.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        from torch.profiler import profile, ProfilerActivity
+
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield
+
+        PROFILER_COUNT += 1
+        Path(PROFILER_TRACE_DIR).mkdir(parents=True, exist_ok=True)
+        prof.export_chrome_trace(
+            str(
+                Path(PROFILER_TRACE_DIR, f"{stage}-{os.getpid()}-{PROFILER_COUNT}.json")
+            )
+        )
+    finally:
+        PROFILER_LOCK.release()
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+@contextmanager
+def instrument(stage, **extra):
+    """
+    Record the wall time of the enclosed code under stage when
+    TRAME_MNIST_INSTRUMENTATION is on. The yielded dict holds extra values
+    to record with it.
+    """
+    if not INSTRUMENTATION:
+        yield {}
+        return
+
+    with _profiled(stage):
+        start = time.perf_counter()
+        yield extra
+        METRICS.record(stage, time.perf_counter() - start, **extra)
+
+
+def metrics_message(key):
+    """Progress channel update with the metrics of this process"""
+    return {key: METRICS.to_dict()} if INSTRUMENTATION else {}
@@ -0,0 +1,156 @@
+import json
+
+import numpy as np
+import torch
+
+from .common import images_to_tensor, maxabs_scale
+from .config import XAI_OCCLUSION_ADAPTIVE, XAI_OCCLUSION_THRESHOLD
+from .resources import RESOURCES
+
+BATCH_SIZE = 256
+
+# -----------------------------------------------------------------------------
+# Coarse-to-fine sliding window occlusion
+# -----------------------------------------------------------------------------
+
+
+def _window(y, x, window):
+    """Slices of a window, which may start before the image or end after it"""
+    return slice(max(y, 0), y + window), slice(max(x, 0), x + window)
+
+
+def _window_starts(length, window, stride):
+    """Window offsets of xaitk SlidingWindow, centering the last one overhang"""
+    starts = np.arange(0, length, stride)
+    return (starts - (window - (length - starts[-1])) // 2).tolist()
+
+
+def _occlusion_scores(
+    model, pixels, positions, window, cancelled=None, batch_size=BATCH_SIZE
+):
+    """
+    Class scores of pixels with a black window at each (y, x) position, or
+    None once cancelled() is true.
+    """
+    scores = []
+    for start in range(0, len(positions), batch_size):
+        if cancelled is not None and cancelled():
+            return None
+
+        chunk = positions[start : start + batch_size]
+        keep = np.ones((len(chunk), *pixels.shape), dtype=np.float32)
+        for mask, (y, x) in zip(keep, chunk):
+            mask[_window(y, x, window)] = 0
+        RESOURCES.apply("xai")
+        scores.append(torch.softmax(model(images_to_tensor(keep * pixels)), 1))
+
+    return torch.cat(scores).numpy() if scores else np.zeros((0, 10), np.float32)
+
+
+class AdaptiveOcclusion:
+    """
+    Sliding window occlusion (score drop averaged over the windows covering
+    each pixel) only evaluating the windows that matter:
+
+    - windows over black pixels leave the image unchanged, so their score
+      drop is 0 without running the model
+    - a coarse pass occludes coarse_window cells, and only the cells whose
+      score drop reaches threshold * the largest one are refined with the
+      fine windows. Other cells keep their coarse score drop.
+
+    Windows are laid out like the xaitk SlidingWindow ones and the maps are
+    scaled per class to [-1, 1] like OcclusionScoring, so with a threshold of
+    0 the result is the SlidingWindowStack one, up to float rounding.
+    """
+
+    cancellable = True
+
+    def __init__(
+        self,
+        window=2,
+        stride=1,
+        coarse_window=4,
+        threshold=XAI_OCCLUSION_THRESHOLD,
+    ):
+        self.window = window
+        self.stride = stride
+        self.coarse_window = coarse_window
+        self.threshold = threshold
+
+    @property
+    def parameters(self):
+        return json.dumps(
+            {
+                "window": self.window,
+                "stride": self.stride,
+                "coarse_window": self.coarse_window,
+                "threshold": self.threshold,
+            },
+            sort_keys=True,
+        )
+
+    def _has_ink(self, ink, y, x, window):
+        return ink[_window(y, x, window)].any()
+
+    @torch.no_grad()
+    def run(self, input, model, cancelled=None):
+        """Saliency maps of input with the number of images model classified"""
+        pixels = np.asarray(input, dtype=np.float32) / 255
+        height, width = pixels.shape
+        ink = pixels > 0
+        reference = torch.softmax(model(images_to_tensor(pixels[None])), 1)[0]
+        reference = reference.numpy()
+        classified = 1
+
+        # Coarse pass
+        cell = self.coarse_window
+        cells = [(y, x) for y in range(0, height, cell) for x in range(0, width, cell)]
+        inked = [p for p in cells if self._has_ink(ink, *p, cell)]
+        coarse = {p: np.zeros(10, dtype=np.float32) for p in cells}
+        scores = _occlusion_scores(model, pixels, inked, cell, cancelled)
+        if scores is None:
+            return None, classified
+        for p, drop in zip(inked, reference - scores):
+            coarse[p] = drop
+        classified += len(inked)
+
+        coarse_map = np.zeros((10, height, width), dtype=np.float32)
+        for (y, x), drop in coarse.items():
+            coarse_map[:, y : y + cell, x : x + cell] = drop[:, None, None]
+
+        # Fine pass in the salient cells
+        largest = max(np.abs(drop).max() for drop in coarse.values())
+        refined = {
+            p
+            for p, drop in coarse.items()
+            if largest > 0 and np.abs(drop).max() >= self.threshold * largest
+        }
+        windows = [
+            (y, x)
+            for y in _window_starts(height, self.window, self.stride)
+            for x in _window_starts(width, self.window, self.stride)
+            if (max(y, 0) // cell * cell, max(x, 0) // cell * cell) in refined
+        ]
+        inked = [p for p in windows if self._has_ink(ink, *p, self.window)]
+        scores = _occlusion_scores(model, pixels, inked, self.window, cancelled)
+        if scores is None:
+            return None, classified
+        drops = reference - scores
+        classified += len(inked)
+
+        total = np.zeros((10, height, width), dtype=np.float32)
+        coverage = np.zeros((height, width), dtype=np.float32)
+        for y, x in windows:
+            coverage[_window(y, x, self.window)] += 1
+        for (y, x), drop in zip(inked, drops):
+            total[(slice(None), *_window(y, x, self.window))] += drop[:, None, None]
+
+        saliency = np.where(coverage > 0, total / np.maximum(coverage, 1), coarse_map)
+        return maxabs_scale(saliency), classified
+
+
+def create_occlusion_instances():
+    """Adaptive occlusion replacing the xaitk SlidingWindowStack when enabled"""
+    if not XAI_OCCLUSION_ADAPTIVE:
+        return {}
+    return {"SlidingWindowStack": AdaptiveOcclusion()}
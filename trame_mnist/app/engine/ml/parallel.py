@@ -0,0 +1,217 @@
+import os
+import copy
+import queue
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from .checkpoints import CheckpointWriter
+from .common import LeNet5, Model
+from .config import TRAINING_THREADS
+from .dataset import get_dataset, BatchLoader
+from .metrics import instrument, metrics_message
+from .progress import ProgressSender, EpochProgress
+
+
+def thread_count(processes=1, threads=TRAINING_THREADS):
+    """Intra-op threads per training process, splitting the cores by default"""
+    if threads > 0:
+        return threads
+    return max(1, (os.cpu_count() or 1) // processes)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _all_reduce_mean(values):
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return (tensor / dist.get_world_size()).tolist()
+
+
+# -----------------------------------------------------------------------------
+# Code running in each data parallel process
+# -----------------------------------------------------------------------------
+
+
+def _rank_loop(rank, processes, port, setup, commands, results, connection):
+    """Keep the process group, model and loaders of a rank across requests"""
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=processes)
+    torch.set_num_threads(setup["threads"])
+
+    model = Model(LeNet5(), setup["learning_rate"])
+    module = model.model
+    parallel_module = DistributedDataParallel(module)
+
+    # Same shard size on every rank so they all run the same number of batches
+    dataset = get_dataset(train=True)
+    indices = setup["training_indices"]
+    shard_size = len(indices) // processes
+    training_loader = BatchLoader(
+        dataset,
+        indices[rank * shard_size : (rank + 1) * shard_size],
+        batch_size=setup["batch"],
+        shuffle=True,
+    )
+    validation_loader = BatchLoader(
+        dataset,
+        setup["validation_indices"],
+        batch_size=setup["batch"],
+        shuffle=True,
+    )
+
+    progress = ProgressSender(connection)
+    checkpoints = CheckpointWriter() if rank == 0 else None
+    for end_epoch, training_state in iter(commands.get, None):
+        # The session may have trained or been reset in between
+        module.load_state_dict(training_state["state_dict"])
+        model.opt.load_state_dict(training_state["optimizer"])
+        model.metadata = training_state["metadata"]
+
+        last_progress = None
+        while model.epoch < end_epoch:
+            epoch_progress = EpochProgress(
+                progress, model.epoch, len(training_loader), processes
+            )
+
+            def on_batch(*args):
+                if setup["budget"] is not None:
+                    setup["budget"].apply(processes)
+                if rank == 0:
+                    epoch_progress.on_batch(*args)
+
+            with instrument("training_epoch", processes=processes) as metrics:
+                model.model = parallel_module
+                model.train_step(training_loader, on_batch)
+                model.model = module
+                model.train_loss[-1], model.train_acc[-1] = _all_reduce_mean(
+                    [model.train_loss[-1], model.train_acc[-1]]
+                )
+                model.epoch += 1
+
+                if rank == 0:
+                    model.validation_step(validation_loader)
+                    epoch_progress.epoch = model.epoch
+                    last_progress = epoch_progress.to_dict(0)
+                    metrics["epoch"] = model.epoch
+                    metrics["samples_per_second"] = last_progress["samples_per_second"]
+
+            if rank == 0:
+                checkpoints.submit(model)
+                progress.send(
+                    {
+                        "model_state": model.metadata,
+                        "training_progress": last_progress,
+                        **metrics_message("training_metrics"),
+                    }
+                )
+
+            dist.barrier()
+
+        if rank == 0:
+            checkpoints.wait()
+            # Copies as queued tensors move to memory shared with the session
+            results.put(
+                {
+                    "state_dict": copy.deepcopy(module.state_dict()),
+                    "optimizer": copy.deepcopy(model.opt.state_dict()),
+                    "metadata": model.metadata,
+                    "progress": last_progress,
+                }
+            )
+
+    dist.destroy_process_group()
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+class DataParallelGroup:
+    """
+    Data parallel processes of a TrainingSession, started on its first data
+    parallel request and kept alive so later requests skip the process
+    spawn, imports, dataset mapping and gloo rendezvous.
+    """
+
+    def __init__(self, session, processes):
+        training_loader, validation_loader = session.loaders
+        setup = {
+            "learning_rate": session.learning_rate,
+            "batch": session.batch,
+            "threads": thread_count(processes),
+            "budget": None if TRAINING_THREADS > 0 else session.threads,
+            "training_indices": training_loader.indices,
+            "validation_indices": validation_loader.indices,
+        }
+
+        context = mp.get_context("spawn")
+        port = _free_port()
+        self.processes = processes
+        self._commands = [context.SimpleQueue() for _ in range(processes)]
+        self._results = context.Queue()
+        self._ranks = [
+            context.Process(
+                target=_rank_loop,
+                args=(
+                    rank,
+                    processes,
+                    port,
+                    setup,
+                    self._commands[rank],
+                    self._results,
+                    session.connection,
+                ),
+                daemon=True,
+            )
+            for rank in range(processes)
+        ]
+        for rank in self._ranks:
+            rank.start()
+
+    def _result(self):
+        while True:
+            try:
+                return self._results.get(timeout=1)
+            except queue.Empty:
+                if not all(rank.is_alive() for rank in self._ranks):
+                    self.close()
+                    raise RuntimeError("A data parallel training process exited")
+
+    def train(self, session, end_epoch):
+        """Run the epochs of a TrainingSession with DistributedDataParallel"""
+        model = session.model
+        if model.epoch >= end_epoch:
+            return
+
+        training_state = {
+            "state_dict": copy.deepcopy(model.model.state_dict()),
+            "optimizer": copy.deepcopy(model.opt.state_dict()),
+            "metadata": model.metadata,
+        }
+        for commands in self._commands:
+            commands.put((end_epoch, training_state))
+
+        result = self._result()
+        model.model.load_state_dict(result["state_dict"])
+        model.opt.load_state_dict(result["optimizer"])
+        model.metadata = result["metadata"]
+        session.last_progress = result["progress"]
+
+    def close(self):
+        for commands, rank in zip(self._commands, self._ranks):
+            if rank.is_alive():
+                commands.put(None)
+        for rank in self._ranks:
+            rank.join(5)
+            if rank.is_alive():
+                rank.terminate()
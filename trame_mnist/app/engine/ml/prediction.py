@@ -1,44 +1,135 @@
 import random
 import numpy as np
-import torchvision
 
-from .common import DATA_DIR, get_model, has_trained_model
+from .checkpoints import checkpoint_info
+from .common import model_fingerprint
+from .dataset import get_dataset
+from .inference import inference_model, compiled_model
+from .store import get_prediction_store, prediction_store_reset
+from .weights import shared_model
+from .xai import xai_cache_clear
 
-MODEL = None
 
-DATASET_TEST = torchvision.datasets.MNIST(
-    root=DATA_DIR,
-    train=False,
-    download=True,
-)
+class PredictionContext:
+    """Mutable prediction state of a session, the model weights being shared"""
 
-LAST_IMAGE = None
+    def __init__(self):
+        self.epoch = None  # Epoch snapshot to use instead of the current model
+        self.model = None
+        self.fingerprint = None
+        self.inference_model = None
+        self.last_image = None
+        self.last_index = None
+        self.failures = None
+        self.failure_cursor = 0
 
 
-def prediction_reload():
-    global MODEL
-    MODEL = get_model() if has_trained_model() else None
-    prediction_update()
-    return has_trained_model()
+CONTEXT = PredictionContext()
 
 
-def prediction_update():
+def _fingerprint(epoch):
+    if epoch is None:
+        return model_fingerprint()
+
+    info = checkpoint_info(epoch)
+    return None if info is None else info["fingerprint"]
+
+
+def prediction_reload(context=CONTEXT):
+    if context.epoch is not None and checkpoint_info(context.epoch) is None:
+        context.epoch = None  # Snapshot removed by a reset
+
+    context.fingerprint = _fingerprint(context.epoch)
+    context.model = shared_model(context.fingerprint, context.epoch)
+    context.inference_model = None
+    if context.model is not None:
+        context.inference_model = compiled_model(inference_model(context.model))
+    context.failures = None
+    prediction_store_reset()
+    xai_cache_clear()
+    prediction_update(context=context)
+    return context.model is not None
+
+
+def prediction_update(index=None, context=CONTEXT):
     # Input
-    size = len(DATASET_TEST)
-    image, label = DATASET_TEST[random.randint(0, size - 1)]
+    dataset = get_dataset(train=False)
+    if index is None:
+        index = random.randint(0, len(dataset) - 1)
+    image, label = dataset.image(index), dataset.label(index)
     prediction = np.zeros(10).tolist()
 
     # Prediction
-    if MODEL is not None:
-        prediction = MODEL.predict(image)
-        prediction = prediction[0].tolist()
+    if context.model is not None:
+        store = get_prediction_store(context.model, fingerprint=context.fingerprint)
+        prediction = store.logits[index].tolist()
 
     # keep track of last input
-    global LAST_IMAGE
-    LAST_IMAGE = image
+    context.last_image = image
+    context.last_index = index
+
+    return index, image, label, prediction
+
+
+def prediction_sample_count():
+    return len(get_dataset(train=False))
+
+
+def prediction_image(index):
+    return get_dataset(train=False).image(index)
+
+
+def prediction_xai_params(context=CONTEXT):
+    """Inference and float32 models with the input and cache key of the sample"""
+    return (
+        context.inference_model,
+        context.model,
+        np.asarray(context.last_image),
+        (context.fingerprint, context.last_index),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Misclassification index
+# -----------------------------------------------------------------------------
+
+
+def build_failure_index(context=CONTEXT):
+    """Misclassified test indices with their confidence"""
+    store = get_prediction_store(context.model, fingerprint=context.fingerprint)
+    scores = store.scores().numpy()
+    classified = np.argmax(scores, axis=1)
+    failed = np.flatnonzero(classified != store.labels)
+    confidence = scores[failed, classified[failed]]
+
+    return {
+        "index": failed,
+        "confidence": confidence,
+        "margin": confidence - scores[failed, store.labels[failed]],
+    }
+
+
+def prediction_next_failure(lowest_confidence=False, context=CONTEXT):
+    """Index of a misclassified test sample or None if there is none"""
+    if context.model is None:
+        return None
+
+    if context.failures is None:
+        context.failures = build_failure_index(context)
+        context.failures["order"] = np.argsort(
+            context.failures["confidence"], kind="stable"
+        )
+        context.failure_cursor = 0
 
-    return image, label, prediction
+    failures = context.failures
+    count = failures["index"].shape[0]
+    if count == 0:
+        return None
 
+    if lowest_confidence:
+        position = failures["order"][context.failure_cursor % count]
+        context.failure_cursor += 1
+    else:
+        position = random.randint(0, count - 1)
 
-def prediction_xai_params():
-    return MODEL.model, np.asarray(LAST_IMAGE)
+    return int(failures["index"][position])
@@ -0,0 +1,56 @@
+import time
+import threading
+
+from .config import TRAINING_PROGRESS_RATE
+
+
+class ProgressSender:
+    """Thread safe end of the progress channel with per-batch coalescing"""
+
+    def __init__(self, connection, rate=TRAINING_PROGRESS_RATE):
+        self._connection = connection
+        self._period = 1.0 / rate if rate > 0 else None
+        self._lock = threading.Lock()
+        self._last_progress = 0
+
+    def send(self, msg):
+        with self._lock:
+            self._connection.send(msg)
+
+    def progress(self, **progress):
+        """Report batch progress, dropped when above the configured rate"""
+        now = time.perf_counter()
+        if self._period is None or now - self._last_progress < self._period:
+            return
+
+        self._last_progress = now
+        self.send({"training_progress": progress})
+
+
+class EpochProgress:
+    """Throughput and running loss of the epoch being trained"""
+
+    def __init__(self, sender, epoch, batch_count, sample_scale=1):
+        self.sender = sender
+        self.epoch = epoch
+        self.batch_count = max(batch_count, 1)
+        self.sample_scale = sample_scale
+        self._start = time.perf_counter()
+        self._samples = 0
+        self._batches = 0
+        self._loss = 0
+
+    def on_batch(self, index, size, loss):
+        self._samples += size * self.sample_scale
+        self._batches += 1
+        self._loss += loss
+        self.sender.progress(**self.to_dict((index + 1) / self.batch_count))
+
+    def to_dict(self, fraction):
+        elapsed = time.perf_counter() - self._start
+        return {
+            "epoch": self.epoch,
+            "fraction": fraction,
+            "samples_per_second": self._samples / elapsed if elapsed else 0,
+            "loss": self._loss / max(self._batches, 1),
+        }
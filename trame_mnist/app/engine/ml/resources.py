@@ -0,0 +1,126 @@
+import os
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+import torch
+
+from .config import CPU_BUDGET
+
+# Share of the cores while active, interactive activities first
+ACTIVITY_WEIGHTS = {
+    "training": 1,
+    "xai": 2,
+    "testing": 2,
+}
+
+
+class ThreadBudget:
+    """Thread count of an activity running in another process"""
+
+    def __init__(self, threads=0):
+        self._value = multiprocessing.Value("i", threads, lock=False)
+
+    def set(self, threads):
+        self._value.value = threads
+
+    def get(self):
+        return self._value.value
+
+    def apply(self, processes=1):
+        """Update torch intra-op threads when the budget changed, 0 keeps them"""
+        if self._value.value > 0:
+            threads = max(1, self._value.value // processes)
+            if threads != torch.get_num_threads():
+                torch.set_num_threads(threads)
+
+
+class ResourceManager:
+    """
+    Split a core budget between the running activities according to their
+    weights. Listeners are notified with the new allocation every time an
+    activity starts or stops.
+    """
+
+    def __init__(self, cores=CPU_BUDGET):
+        self.cores = cores if cores > 0 else os.cpu_count() or 1
+        self._running = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def allocation(self):
+        """Cores of each running activity, at least one each"""
+        with self._lock:
+            running = list(self._running)
+
+        if not running:
+            return {}
+
+        total = sum(ACTIVITY_WEIGHTS[name] for name in running)
+        shares = {
+            name: max(1, self.cores * ACTIVITY_WEIGHTS[name] // total)
+            for name in running
+        }
+
+        # Leftover cores to the most important activity
+        favored = max(running, key=ACTIVITY_WEIGHTS.get)
+        shares[favored] += max(0, self.cores - sum(shares.values()))
+        return shares
+
+    def threads(self, name):
+        """Cores of an activity, the whole budget when it runs alone"""
+        return self.allocation().get(name, self.cores)
+
+    def job_threads(self, name):
+        """Cores of one of the concurrent jobs of an activity"""
+        allocation = self.allocation()
+        with self._lock:
+            jobs = self._running.get(name, 0)
+        if name not in allocation or jobs == 0:
+            return self.cores
+        return max(1, allocation[name] // jobs)
+
+    def apply(self, name):
+        """
+        Set the intra-op threads of the calling thread to the share of one
+        job of the activity. Torch thread settings only affect the thread
+        making the call, so each job applies its own share, and re-applies it
+        between steps to follow the activities starting and stopping.
+        """
+        threads = self.job_threads(name)
+        if threads != torch.get_num_threads():
+            torch.set_num_threads(threads)
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    def start(self, name):
+        with self._lock:
+            self._running[name] = self._running.get(name, 0) + 1
+        self._rebalance()
+
+    def stop(self, name):
+        with self._lock:
+            if name in self._running:
+                self._running[name] -= 1
+                if self._running[name] == 0:
+                    del self._running[name]
+        self._rebalance()
+
+    @contextmanager
+    def activity(self, name):
+        """Run a job of an activity in the calling thread"""
+        self.start(name)
+        try:
+            self.apply(name)
+            yield self.threads(name)
+        finally:
+            self.stop(name)
+
+    def _rebalance(self):
+        allocation = self.allocation()
+        for callback in self._listeners:
+            callback(allocation)
+
+
+RESOURCES = ResourceManager()
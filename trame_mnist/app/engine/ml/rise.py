@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .common import DATA_DIR, images_to_tensor, maxabs_scale
+from .config import XAI_RISE_PROGRESSIVE, XAI_RISE_CHUNK, XAI_RISE_TOLERANCE
+from .resources import RESOURCES
+
+MASK_DIR = Path(DATA_DIR, "xai")
+
+MASK_BANKS = {}
+MASK_BANKS_LOCK = threading.Lock()
+
+# -----------------------------------------------------------------------------
+# Random Input Sampling for Explanation (debiased)
+# -----------------------------------------------------------------------------
+
+
+def rise_masks(n, s, p1, seed, size=(28, 28)):
+    """Bilinearly upsampled s x s binary grids, randomly shifted by a cell"""
+    rng = np.random.default_rng(seed)
+    cell = [-(-length // s) for length in size]
+    grid = (rng.random((n, 1, s, s)) < p1).astype(np.float32)
+    upsampled = F.interpolate(
+        torch.from_numpy(grid),
+        size=((s + 1) * cell[0], (s + 1) * cell[1]),
+        mode="bilinear",
+        align_corners=False,
+    )[:, 0].numpy()
+
+    # Crop every mask at its own shift with a single gather
+    rows = rng.integers(0, cell[0], n)[:, None] + np.arange(size[0])
+    columns = rng.integers(0, cell[1], n)[:, None] + np.arange(size[1])
+    return np.ascontiguousarray(
+        upsampled[np.arange(n)[:, None, None], rows[:, :, None], columns[:, None, :]]
+    )
+
+
+def mask_bank(n, s, p1, seed, size=(28, 28)):
+    """
+    Masks of a RISE configuration generated once and stored next to the data,
+    then memory mapped so every run and process shares the same pages.
+    """
+    key = (n, s, p1, seed, tuple(size))
+    with MASK_BANKS_LOCK:
+        if key not in MASK_BANKS:
+            path = Path(MASK_DIR, f"rise-{n}-{s}-{p1}-{seed}-{size[0]}x{size[1]}.npy")
+            if not path.exists():
+                MASK_DIR.mkdir(parents=True, exist_ok=True)
+                tmp_path = Path(f"{path}.{os.getpid()}.tmp")
+                with open(tmp_path, "wb") as file:
+                    np.save(file, rise_masks(n, s, p1, seed, size))
+                os.replace(tmp_path, path)
+
+            MASK_BANKS[key] = np.load(path, mmap_mode="r")
+
+        return MASK_BANKS[key]
+
+
+class ProgressiveRise:
+    """
+    RISE evaluating its masks in chunks. The running saliency maps, scaled
+    per class to [-1, 1] like xaitk RISEStack, are reported after each chunk.
+    With a tolerance above 0 the evaluation stops once the scaled maps change
+    by less than it (mean absolute difference) from one chunk to the next.
+
+    On MNIST the 200 masks are not enough for the maps to settle, so early
+    stopping is disabled by default to match RISEStack.
+    """
+
+    progressive = True
+    cancellable = True
+
+    def __init__(
+        self,
+        n=200,
+        s=8,
+        p1=0.5,
+        seed=1234,
+        chunk=XAI_RISE_CHUNK,
+        tolerance=XAI_RISE_TOLERANCE,
+    ):
+        self.n = n
+        self.s = s
+        self.p1 = p1
+        self.seed = seed
+        self.chunk = chunk
+        self.tolerance = tolerance
+
+    @property
+    def parameters(self):
+        return json.dumps(
+            {
+                "n": self.n,
+                "s": self.s,
+                "p1": self.p1,
+                "seed": self.seed,
+                "chunk": self.chunk,
+                "tolerance": self.tolerance,
+            },
+            sort_keys=True,
+        )
+
+    @torch.no_grad()
+    def run(self, input, model, on_update=None, cancelled=None):
+        """Saliency maps of input with the number of images model classified"""
+        masks = mask_bank(self.n, self.s, self.p1, self.seed, np.shape(input))
+        pixels = np.asarray(input, dtype=np.float32) / 255
+
+        total = np.zeros((10, pixels.size), dtype=np.float64)
+        saliency = previous = None
+        classified = 0
+        for start in range(0, self.n, self.chunk):
+            if cancelled is not None and cancelled():
+                return None, classified
+
+            chunk = masks[start : start + self.chunk]
+            RESOURCES.apply("xai")
+
+            # Whole perturbed batch from one broadcast multiply
+            scores = torch.softmax(model(images_to_tensor(chunk * pixels)), 1)
+            scores = scores.numpy().astype(np.float64)
+
+            # Debiased sum of scores * (mask - p1) as a single matrix product
+            total += scores.T @ chunk.reshape(chunk.shape[0], -1)
+            total -= self.p1 * scores.sum(0)[:, None]
+
+            classified = start + chunk.shape[0]
+            saliency = maxabs_scale(total.reshape(10, *pixels.shape))
+            if on_update is not None:
+                on_update(saliency)
+
+            if previous is not None and self.tolerance > 0:
+                if np.abs(saliency - previous).mean() <= self.tolerance:
+                    break
+            previous = saliency
+
+        return saliency, classified
+
+
+def create_rise_instances():
+    """Progressive RISE replacing the xaitk RISEStack when enabled"""
+    if not XAI_RISE_PROGRESSIVE:
+        return {}
+    return {"RISEStack": ProgressiveRise()}
@@ -0,0 +1,102 @@
+import json
+import numpy as np
+
+# pytorch
+import torch
+
+# xaitk-saliency
+from smqtk_classifier import ClassifyImage
+from xaitk_saliency.impls.gen_image_classifier_blackbox_sal import (
+    rise,
+    slidingwindow as sw,
+)
+
+# App specific
+from .common import images_to_tensor
+from .resources import RESOURCES
+
+BATCH_SIZE = 256
+
+
+# SMQTK black-box classifier
+class ClfModel(ClassifyImage):
+    def __init__(self, model, batch_size=BATCH_SIZE):
+        self.model = model
+        self.batch_size = batch_size
+        self.classified = 0
+        self._labels = list(range(10))
+
+    def get_labels(self):
+        return self._labels
+
+    def classify_images(self, image_iter):
+        batch = []
+        for img in image_iter:
+            batch.append(img)
+            if len(batch) == self.batch_size:
+                yield from self._classify_batch(batch)
+                batch = []
+
+        if batch:
+            yield from self._classify_batch(batch)
+
+    def _classify_batch(self, images):
+        RESOURCES.apply("xai")
+        with torch.no_grad():
+            inp = images_to_tensor(np.stack(images))
+            out = torch.softmax(self.model(inp), dim=1).cpu().numpy()
+        self.classified += len(images)
+
+        for scores in out:
+            yield dict(zip(self._labels, scores))
+
+    def get_config(self):
+        # Required by a parent class.
+        return {}
+
+
+class ClassificationSaliency:
+    """
+    Stateless saliency method shared by all the sessions of the process.
+    xaitk only reads its thread count at construction, so a method is built
+    for each XAI share of the CPU budget.
+    """
+
+    def __init__(self, create_method):
+        self._create_method = create_method
+        self._methods = {}
+
+    def _saliency(self, threads):
+        if threads not in self._methods:
+            self._methods[threads] = self._create_method(threads)
+        return self._methods[threads]
+
+    @property
+    def parameters(self):
+        config = self._saliency(1).get_config()
+        config.pop("threads", None)
+        return json.dumps(config, sort_keys=True)
+
+    def run(self, input, model):
+        """Saliency maps of input with the number of images model classified"""
+        class_model = ClfModel(model)
+        saliency = self._saliency(RESOURCES.job_threads("xai"))
+        return saliency(input, class_model), class_model.classified
+
+
+# -----------------------------------------------------------------------------
+
+
+def create_instances():
+    def method_rise(threads):
+        return rise.RISEStack(
+            n=200, s=8, p1=0.5, seed=1234, threads=threads, debiased=True
+        )
+
+    def method_sw(threads):
+        return sw.SlidingWindowStack(window_size=[2, 2], stride=[1, 1], threads=threads)
+
+    return {
+        "RISEStack": ClassificationSaliency(method_rise),
+        "SlidingWindowStack": ClassificationSaliency(method_sw),
+    }
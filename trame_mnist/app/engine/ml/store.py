@@ -0,0 +1,100 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from .checkpoints import checkpoint_fingerprints
+from .common import MODEL_PATH, get_model, model_fingerprint
+from .config import INFERENCE_MODE, PREDICTION_STORE_DTYPE, TESTING_BATCH_SIZE
+from .dataset import get_dataset, BatchLoader
+from .inference import inference_model
+
+STORES = {}
+
+
+class PredictionStore:
+    """Logits of the full test set for a given checkpoint and inference mode"""
+
+    def __init__(self, fingerprint, mode, logits):
+        self.fingerprint = fingerprint
+        self.mode = mode
+        self.logits = logits
+        self.labels = get_dataset(train=False).labels.numpy()
+
+    def __len__(self):
+        return self.logits.shape[0]
+
+    def classified(self):
+        return np.argmax(self.logits, axis=1)
+
+    def accuracy(self):
+        return float(np.mean(self.classified() == self.labels))
+
+    def scores(self):
+        return torch.softmax(torch.from_numpy(np.array(self.logits, np.float32)), 1)
+
+
+def store_path(fingerprint, mode):
+    return Path(f"{MODEL_PATH}.{fingerprint[:16]}.{mode}.logits.npy")
+
+
+@torch.no_grad()
+def compute_logits(model, dtype=PREDICTION_STORE_DTYPE):
+    model.eval()
+    outputs = [
+        model(inputs)
+        for inputs, _ in BatchLoader(
+            get_dataset(train=False), batch_size=TESTING_BATCH_SIZE
+        )
+    ]
+    return torch.cat(outputs).numpy().astype(dtype)
+
+
+def _save_logits(path, fingerprint, logits):
+    # Only keep the stores of the current checkpoint and of the epoch snapshots
+    kept = {fingerprint, model_fingerprint(), *checkpoint_fingerprints()}
+    prefixes = tuple(f"{MODEL_PATH.name}.{fp[:16]}." for fp in kept if fp)
+    for stored in Path(MODEL_PATH).parent.glob(f"{MODEL_PATH.name}.*.logits.npy"):
+        if not stored.name.startswith(prefixes):
+            stored.unlink()
+
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as file:
+        np.save(file, logits)
+    os.replace(tmp_path, path)
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+def get_prediction_store(model=None, mode=INFERENCE_MODE, fingerprint=None):
+    """
+    Store of a checkpoint (the current one by default), computed and persisted
+    on first use. The provided model is the float32 one of that checkpoint,
+    converted for the requested mode.
+    """
+    fingerprint = fingerprint or model_fingerprint()
+    if fingerprint is None:
+        return None
+
+    if (fingerprint, mode) in STORES:
+        return STORES[(fingerprint, mode)]
+
+    path = store_path(fingerprint, mode)
+    if path.exists():
+        logits = np.load(path, mmap_mode="r")
+    else:
+        if model is None:
+            model = get_model().model
+        logits = compute_logits(inference_model(model, mode))
+        _save_logits(path, fingerprint, logits)
+
+    STORES[(fingerprint, mode)] = PredictionStore(fingerprint, mode, logits)
+    return STORES[(fingerprint, mode)]
+
+
+def prediction_store_reset():
+    STORES.clear()
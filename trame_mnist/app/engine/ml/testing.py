@@ -1,42 +1,70 @@
 import torch
-import torchvision
 import numpy as np
 
-from .common import DATA_DIR, TRANSFORM
-from .prediction import get_model
+from .common import get_model
+from .config import TESTING_BATCH_SIZE
+from .dataset import get_dataset, BatchLoader
+from .metrics import instrument
+from .store import get_prediction_store
 
-BATCH_SIZE = 32
 
-DATASET_TEST = torchvision.datasets.MNIST(
-    root=DATA_DIR,
-    train=False,
-    download=True,
-    transform=TRANSFORM,
-)
+def create_testing_loader(batch_size=TESTING_BATCH_SIZE):
+    return BatchLoader(get_dataset(train=False), batch_size=batch_size)
 
-LOADER_TEST = torch.utils.data.DataLoader(
-    DATASET_TEST,
-    batch_size=BATCH_SIZE,
-    shuffle=True,
-)
 
+def class_metrics(confusion_matrix):
+    """Per-class precision (matrix rows) and recall (matrix columns)"""
+    true_positive = np.diag(confusion_matrix)
+    classified = confusion_matrix.sum(axis=1)
+    ground_truth = confusion_matrix.sum(axis=0)
 
-def winner_class(classes):
-    v = np.amax(classes)
-    i = np.where(classes == v)
-    return int(i[0])
+    precision = np.divide(
+        true_positive, classified, out=np.zeros(10), where=classified > 0
+    )
+    recall = np.divide(
+        true_positive, ground_truth, out=np.zeros(10), where=ground_truth > 0
+    )
 
+    return {
+        "precision": precision.tolist(),
+        "recall": recall.tolist(),
+    }
 
+
+@instrument("testing_run")
 @torch.no_grad()
-def testing_run(datasets=LOADER_TEST):
-    model = get_model().model
-    model.eval()
-    confusion_matrix = np.zeros((10, 10), dtype=np.float64)
-    for inputs, targets in datasets:
-        outputs = model(inputs).numpy()
-        for i in range(inputs.shape[0]):
-            confusion_matrix[winner_class(outputs[i])][int(targets[i])] += 1
-
-    total = np.sum(confusion_matrix)
-
-    return np.around(confusion_matrix), int(total)
+def testing_run(datasets=None, model=None, fingerprint=None):
+    """Confusion matrix of a checkpoint, the current one by default"""
+    counts = np.zeros(100, dtype=np.int64)
+    if datasets is None:
+        # Served from the checkpoint predictions
+        store = get_prediction_store(model, fingerprint=fingerprint)
+        if store is None:
+            # No checkpoint yet, e.g. after a reset
+            confusion_matrix = np.zeros((10, 10))
+            return (
+                confusion_matrix,
+                0,
+                {**class_metrics(confusion_matrix), "accuracy": {}},
+            )
+        counts += np.bincount(store.classified() * 10 + store.labels, minlength=100)
+    else:
+        model = get_model().model if model is None else model
+        model.eval()
+        for inputs, targets in datasets:
+            classified = model(inputs).argmax(1)
+            counts += np.bincount((classified * 10 + targets).numpy(), minlength=100)
+
+    confusion_matrix = counts.reshape(10, 10).astype(np.float64)
+    total = int(counts.sum())
+    metrics = class_metrics(confusion_matrix)
+
+    if datasets is None:
+        # Side by side accuracy of the inference mode and its float32 reference
+        metrics["accuracy"] = {store.mode: store.accuracy()}
+        if store.mode != "float32":
+            metrics["accuracy"]["float32"] = get_prediction_store(
+                model, "float32", store.fingerprint
+            ).accuracy()
+
+    return confusion_matrix, total, metrics
@@ -1,29 +1,31 @@
-import torch
-import torchvision
-
-from .common import TRANSFORM, DATA_DIR, get_model
+import copy
+import threading
 
-DATASET_TRAINING = torchvision.datasets.MNIST(
-    root=DATA_DIR,
-    train=True,
-    download=True,
-    transform=TRANSFORM,
-)
+import torch
 
+from .checkpoints import CheckpointWriter
+from .common import LeNet5, Model, delete_model, get_model, save_checkpoint
+from .config import TRAINING_THREADS
+from .dataset import get_dataset, BatchLoader
+from .metrics import instrument, metrics_message
+from .parallel import DataParallelGroup, thread_count
+from .progress import ProgressSender, EpochProgress
 
-def create_training_loaders(batch_size):
-    training_set = DATASET_TRAINING
 
-    training_set, validation_set = torch.utils.data.random_split(
-        training_set, [55000, 5000]
-    )
+def create_training_loaders(batch_size, validation_size=5000):
+    training_set = get_dataset(train=True)
+    indices = torch.randperm(len(training_set))
 
-    train_loader = torch.utils.data.DataLoader(
-        training_set, batch_size=batch_size, shuffle=True
+    train_loader = BatchLoader(
+        training_set,
+        indices[validation_size:],
+        batch_size=batch_size,
+        shuffle=True,
     )
 
-    validation_loader = torch.utils.data.DataLoader(
-        validation_set,
+    validation_loader = BatchLoader(
+        training_set,
+        indices[:validation_size],
         batch_size=batch_size,
         shuffle=True,
     )
@@ -34,24 +36,133 @@ def create_training_loaders(batch_size):
 # -----------------------------------------------------------------------------
 
 
-def training_add(queue, end_epoch, learning_rate=1e-5, batch=32):
-    queue.put_nowait(dict(training_running=True, epoch_end=end_epoch))
-    model = get_model(learning_rate)
-    training_loader, validation_loader = create_training_loaders(batch)
+class TrainingSession:
+    """Model, optimizer and loaders kept in memory across training requests"""
 
-    while model.epoch < end_epoch:
-        model.train_step(training_loader)
-        model.validation_step(validation_loader)
-        model.epoch += 1
-        queue.put_nowait({"model_state": model.metadata})
+    def __init__(self, connection, learning_rate=1e-5, batch=32, threads=None):
+        self.connection = connection
+        self.threads = threads
+        self.progress = ProgressSender(connection)
+        self.learning_rate = learning_rate
+        self.batch = batch
+        self.model = get_model(learning_rate)
+        self.loaders = create_training_loaders(batch)
+        self.last_progress = self._idle_progress()
+        self.checkpoints = CheckpointWriter()
+        self._checkpoint = None
+        self._parallel = None
 
-    queue.put_nowait(
-        {
-            "epoch_end": max(end_epoch, model.epoch),
-            "model_state": model.metadata,
-            "training_running": False,
+    def _idle_progress(self):
+        return {
+            "epoch": self.model.epoch,
+            "fraction": 0,
+            "samples_per_second": 0,
+            "loss": 0,
         }
-    )
 
-    model.save()
-    queue.put_nowait("stop")
+    def train(self, end_epoch, processes=1):
+        self.wait()
+        self.progress.send(dict(training_running=True, epoch_end=end_epoch))
+
+        try:
+            if processes > 1:
+                self._parallel_group(processes).train(self, end_epoch)
+            else:
+                self.apply_threads()
+                while self.model.epoch < end_epoch:
+                    self.run_epoch(*self.loaders)
+        except Exception as error:
+            # Keep the last completed epoch, data parallel processes start over
+            print(f"Training failed at epoch {self.model.epoch}: {error}")
+            self._close_parallel_group()
+
+        self.progress.send(
+            {
+                "epoch_end": max(end_epoch, self.model.epoch),
+                "model_state": self.model.metadata,
+                "training_progress": self.last_progress,
+                "training_running": False,
+            }
+        )
+
+        # Write checkpoint in the background while we wait for the next request
+        self._checkpoint = threading.Thread(
+            target=self._save,
+            args=(
+                copy.deepcopy(self.model.model.state_dict()),
+                copy.deepcopy(self.model.metadata),
+            ),
+        )
+        self._checkpoint.start()
+
+    def run_epoch(self, training_loader, validation_loader):
+        epoch_progress = EpochProgress(
+            self.progress, self.model.epoch, len(training_loader)
+        )
+
+        def on_batch(*args):
+            self.apply_threads()
+            epoch_progress.on_batch(*args)
+
+        with instrument("training_epoch") as metrics:
+            self.model.train_step(training_loader, on_batch)
+            self.model.validation_step(validation_loader)
+            self.model.epoch += 1
+            epoch_progress.epoch = self.model.epoch
+            self.last_progress = epoch_progress.to_dict(0)
+            metrics["epoch"] = self.model.epoch
+            metrics["samples_per_second"] = self.last_progress["samples_per_second"]
+
+        self.checkpoints.submit(self.model)
+        self.progress.send(
+            {
+                "model_state": self.model.metadata,
+                "training_progress": self.last_progress,
+                **metrics_message("training_metrics"),
+            }
+        )
+
+    def _parallel_group(self, processes):
+        if self._parallel is not None and self._parallel.processes != processes:
+            self._close_parallel_group()
+
+        if self._parallel is None:
+            self._parallel = DataParallelGroup(self, processes)
+
+        return self._parallel
+
+    def apply_threads(self, processes=1):
+        """Follow the thread budget of the engine unless threads are pinned"""
+        if TRAINING_THREADS > 0:
+            torch.set_num_threads(thread_count(processes))
+        elif self.threads is not None:
+            self.threads.apply(processes)
+
+    def _close_parallel_group(self):
+        if self._parallel is not None:
+            self._parallel.close()
+            self._parallel = None
+
+    def _save(self, state_dict, metadata):
+        try:
+            save_checkpoint(state_dict, metadata)
+            self.checkpoints.wait()
+        except Exception as error:
+            print(f"Could not save the model: {error}")
+        finally:
+            self.progress.send("stop")
+
+    def reset(self):
+        self.wait()
+        delete_model()
+        self.model = Model(LeNet5(), self.learning_rate)
+        self.last_progress = self._idle_progress()
+
+    def wait(self):
+        if self._checkpoint is not None:
+            self._checkpoint.join()
+            self._checkpoint = None
+
+    def close(self):
+        self.wait()
+        self._close_parallel_group()
@@ -0,0 +1,54 @@
+import threading
+from pathlib import Path
+
+from .checkpoints import checkpoint_info, epoch_weights_path, map_weights, write_weights
+from .common import MODEL_PATH, get_model, model_fingerprint
+
+MODELS = {}
+MODELS_LOCK = threading.Lock()
+
+
+def weights_path(fingerprint):
+    return Path(f"{MODEL_PATH}.{fingerprint[:16]}.weights.npy")
+
+
+def _export_weights(path, fingerprint):
+    # Only keep the weights of the current checkpoint
+    for stored in Path(MODEL_PATH).parent.glob(f"{MODEL_PATH.name}.*.weights.npy"):
+        if not stored.name.startswith(f"{MODEL_PATH.name}.{fingerprint[:16]}."):
+            stored.unlink()
+
+    write_weights(path, get_model().model.state_dict())
+
+
+# -----------------------------------------------------------------------------
+# API to be used outside
+# -----------------------------------------------------------------------------
+
+
+def shared_model(fingerprint=None, epoch=None):
+    """
+    Read-only LeNet5 of the current checkpoint, or of an epoch snapshot,
+    shared by every session of the process. Its weights are memory mapped
+    from a file so all the processes serving it share the same physical pages.
+    """
+    if epoch is not None:
+        info = checkpoint_info(epoch)
+        if info is None:
+            return None
+        fingerprint, path = info["fingerprint"], epoch_weights_path(epoch)
+    else:
+        fingerprint = fingerprint or model_fingerprint()
+        if fingerprint is None:
+            return None
+        path = weights_path(fingerprint)
+
+    with MODELS_LOCK:
+        if fingerprint not in MODELS:
+            if epoch is None and not path.exists():
+                _export_weights(path, fingerprint)
+
+            MODELS.clear()
+            MODELS[fingerprint] = map_weights(path)
+
+        return MODELS[fingerprint]
@@ -0,0 +1,54 @@
+import atexit
+import multiprocessing
+
+from .resources import ThreadBudget
+from .training import TrainingSession
+
+
+def _worker_loop(commands, connection, learning_rate, batch, threads):
+    session = None
+    for command, *args in iter(commands.get, None):
+        if command == "train":
+            try:
+                if session is None:
+                    session = TrainingSession(connection, learning_rate, batch, threads)
+            except Exception as error:
+                print(f"Could not start training: {error}")
+                connection.send({"training_running": False})
+                connection.send("stop")
+                continue
+            session.train(*args)
+        elif command == "reset" and session is not None:
+            session.reset()
+
+    if session is not None:
+        session.close()
+
+
+class TrainingWorker:
+    """Long-lived process owning the TrainingSession of the application"""
+
+    def __init__(self, connection, learning_rate=1e-5, batch=32):
+        self._commands = multiprocessing.Queue()
+        self.threads = ThreadBudget()
+        self._process = multiprocessing.Process(
+            target=_worker_loop,
+            args=(self._commands, connection, learning_rate, batch, self.threads),
+        )
+        # Not a daemon so it can spawn data parallel processes
+        self._process.start()
+        atexit.register(self.close)
+
+    def train(self, end_epoch, processes=1):
+        self._commands.put(("train", end_epoch, processes))
+
+    def reset(self):
+        self._commands.put(("reset",))
+
+    def is_alive(self):
+        return self._process.is_alive()
+
+    def close(self):
+        if self._process.is_alive():
+            self._commands.put(None)
+            self._process.join()
@@ -1,69 +1,122 @@
-from scipy.special import softmax
+import threading
+from collections import OrderedDict
+
+from .config import XAI_CACHE_SIZE_MB
+from .metrics import instrument
+from .resources import RESOURCES
+
+
+class SaliencyCache:
+    """LRU of saliency maps bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
 
-# pytorch
-import torch
-import torch.nn as nn
+    def put(self, key, result):
+        if result.nbytes > self.max_bytes:
+            return
 
-# xaitk-saliency
-from smqtk_classifier import ClassifyImage
-from xaitk_saliency.impls.gen_image_classifier_blackbox_sal import (
-    rise,
-    slidingwindow as sw,
-)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key).nbytes
 
-# App specific
-from .common import TRANSFORM
+            self._entries[key] = result
+            self.nbytes += result.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
 
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
 
-# SMQTK black-box classifier
-class ClfModel(ClassifyImage):
-    def __init__(self, model):
-        self.model = model
-        self._labels = list(range(10))
 
-    def get_labels(self):
-        return self._labels
+# -----------------------------------------------------------------------------
 
-    @torch.no_grad()
-    def classify_images(self, image_iter):
-        for img in image_iter:
-            inp = TRANSFORM(img).unsqueeze(0)
-            vec = self.model(inp).cpu().numpy().squeeze()
-            out = softmax(vec)
-            yield dict(zip(self.get_labels(), out))
+SALIENCY_TYPES = [
+    "RISEStack",
+    "SlidingWindowStack",
+    "Gradient",
+    "IntegratedGradients",
+    "GradCAM",
+]
 
-    def get_config(self):
-        # Required by a parent class.
-        return {}
+# Methods needing the float32 model with autograd instead of the inference one
+WHITE_BOX_TYPES = ["Gradient", "IntegratedGradients", "GradCAM"]
 
+INSTANCES = None
+INSTANCES_LOCK = threading.Lock()
 
-class ClassificationSaliency:
-    def __init__(self, method):
-        self._saliency = method
-        self._model = None
-        self._class_model = None
+CACHE = SaliencyCache(int(XAI_CACHE_SIZE_MB * 1024 * 1024))
 
-    def set_model(self, model):
-        if self._model != model:
-            self._model = model
-            self._class_model = ClfModel(self._model)
 
-    def run(self, input, *_):
-        return self._saliency(input, self._class_model)
+def get_instances():
+    """Saliency methods, only importing xaitk-saliency for the ones it provides"""
+    global INSTANCES
+    with INSTANCES_LOCK:
+        if INSTANCES is None:
+            from .gradients import create_gradient_instances
+            from .occlusion import create_occlusion_instances
+            from .rise import create_rise_instances
 
+            instances = {
+                **create_rise_instances(),
+                **create_occlusion_instances(),
+                **create_gradient_instances(),
+            }
 
-SALIENCY_TYPES = ["RISEStack", "SlidingWindowStack"]
+            if any(name not in instances for name in SALIENCY_TYPES):
+                from .saliency import create_instances
 
-METHOD_RISE = rise.RISEStack(n=200, s=8, p1=0.5, seed=1234, threads=4, debiased=True)
-METHOD_SW = sw.SlidingWindowStack(window_size=[2, 2], stride=[1, 1], threads=4)
+                instances = {**create_instances(), **instances}
 
-INSTANCES = {
-    "RISEStack": ClassificationSaliency(METHOD_RISE),
-    "SlidingWindowStack": ClassificationSaliency(METHOD_SW),
-}
+            INSTANCES = instances
 
+    return INSTANCES
 
-def xai_update(model, input, name="RISEStack"):
-    xai_model = INSTANCES[name]
-    xai_model.set_model(model)
-    return xai_model.run(input)
+
+def xai_update(
+    model, input, name="RISEStack", sample_key=None, on_update=None, cancelled=None
+):
+    """
+    Saliency maps of the 10 classes for input. Progressive methods call
+    on_update with their intermediate maps. Cancellable methods give up
+    between steps once cancelled() is true, returning None.
+    """
+    xai_model = get_instances()[name]
+    key = None
+    if sample_key is not None and sample_key[0] is not None:
+        key = (*sample_key, name, xai_model.parameters)
+        result = CACHE.get(key)
+        if result is not None:
+            return result
+
+    options = {}
+    if getattr(xai_model, "progressive", False):
+        options["on_update"] = on_update
+    if getattr(xai_model, "cancellable", False):
+        options["cancelled"] = cancelled
+
+    RESOURCES.apply("xai")
+    with instrument(f"xai_{name}") as metrics:
+        result, metrics["classified_images"] = xai_model.run(input, model, **options)
+
+    if key is not None and result is not None:
+        CACHE.put(key, result)
+
+    return result
+
+
+def xai_cache_clear():
+    CACHE.clear()
@@ -1,28 +1,150 @@
+import io
+import base64
 import asyncio
-from .ml import prediction_reload
+import multiprocessing
+from functools import lru_cache
+
+import numpy as np
+
+from .ml import (
+    checkpoint_epochs,
+    prediction_reload,
+    prediction_image,
+    prediction_sample_count,
+    metrics_message,
+)
+from .ml.config import IMAGE_CACHE_SIZE, IMAGE_CACHE_PREBUILD, XAI_HEATMAP_ENCODING
 from trame import state
 
 
-async def queue_to_state(queue, *tasks):
-    _process_running = True
-    while _process_running:
-        if queue.empty():
-            await asyncio.sleep(1)
-        else:
-            msg = queue.get_nowait()
-            if isinstance(msg, str):
-                # command
-                if msg == "stop":
-                    _process_running = False
-            else:
-                # Need to monitor as we are outside of client/server update
-                with state.monitor():
-                    # state update (dict)
-                    state.update(msg)
-
-    await asyncio.gather(*tasks)
+def startup_report(timings):
+    """Publish and print how long it took to serve the first page"""
+    state.startup_timings = timings
+    print(
+        "Startup timings:",
+        ", ".join(f"{name}={value:.2f}s" for name, value in timings.items()),
+    )
+
+
+def metrics_to_state():
+    """Publish the stage timings when instrumentation is enabled"""
+    state.update(metrics_message("engine_metrics"))
+
+
+# -----------------------------------------------------------------------------
+# Training progress
+# -----------------------------------------------------------------------------
+
+
+class ProgressChannel:
+    """Pipe from the training worker whose messages are pushed to the state"""
+
+    def __init__(self):
+        self._loop = None
+        self._stopped = None
+
+    def attach(self, loop):
+        self._loop = loop
+
+    def open_writer(self):
+        """
+        New pipe for a training worker. Once the worker holds the returned
+        writer, the caller closes its own copy so a worker exit shows up as
+        end of file.
+        """
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        self._loop.add_reader(reader.fileno(), self._on_readable, reader)
+        return writer
+
+    def expect_stop(self):
+        self._stopped = asyncio.get_event_loop().create_future()
+        return self._stopped
+
+    def _resolve_stop(self):
+        if self._stopped is not None and not self._stopped.done():
+            self._stopped.set_result(True)
+
+    def _on_readable(self, reader):
+        # Coalesce everything available into a single state update
+        updates = {}
+        try:
+            while reader.poll():
+                msg = reader.recv()
+                if isinstance(msg, str):
+                    # command
+                    if msg == "stop":
+                        self._resolve_stop()
+                else:
+                    updates.update(msg)
+        except EOFError:
+            # Worker is gone
+            self._loop.remove_reader(reader.fileno())
+            reader.close()
+            updates["training_running"] = False
+            self._resolve_stop()
+
+        if updates:
+            # Need to monitor as we are outside of client/server update
+            with state.monitor():
+                state.update(updates)
+
+
+async def progress_to_state(stopped, prediction_context):
+    await stopped
 
     # Make sure we can go to prediction
-    state.prediction_available = prediction_reload()
+    state.prediction_available = prediction_reload(prediction_context)
+    state.checkpoint_epochs = checkpoint_epochs()
     state.testing_count = 0
-    state.flush("prediction_available", "testing_count")
+    state.flush("prediction_available", "checkpoint_epochs", "testing_count")
+
+
+# -----------------------------------------------------------------------------
+# In memory image encoding
+# -----------------------------------------------------------------------------
+
+
+def image_to_data_url(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return f"data:image/png;base64,{data}"
+
+
+@lru_cache(maxsize=None if IMAGE_CACHE_PREBUILD else IMAGE_CACHE_SIZE)
+def sample_data_url(index):
+    return image_to_data_url(prediction_image(index))
+
+
+def prebuild_data_urls():
+    if IMAGE_CACHE_PREBUILD:
+        for index in range(prediction_sample_count()):
+            sample_data_url(index)
+
+
+# -----------------------------------------------------------------------------
+# Saliency heatmaps transport
+# -----------------------------------------------------------------------------
+
+
+def heatmaps_to_state(result, encoding=XAI_HEATMAP_ENCODING, color_range=(-1, 1)):
+    """
+    Serialize the 10 class saliency maps for XaiImage.
+
+    With the "uint8" encoding, maps are quantized over their data range and
+    the color range is expressed in that quantized space so the client can
+    use the values as-is.
+    """
+    data_range = [float(np.amin(result)), float(np.amax(result))]
+    output = {"range": data_range}
+
+    if encoding == "uint8":
+        span = data_range[1] - data_range[0]
+        scale = 255 / span if span > 0 else 1
+        quantized = np.rint((result - data_range[0]) * scale).astype(np.uint8)
+        output["color_range"] = [(v - data_range[0]) * scale for v in color_range]
+        output["heatmaps"] = {f"{i}": quantized[i].ravel().tolist() for i in range(10)}
+    else:
+        output["heatmaps"] = {f"{i}": result[i].ravel().tolist() for i in range(10)}
+
+    return output
@@ -14,7 +14,17 @@ with layout.toolbar as tb:
     vuetify.VSpacer()
 
     # Training buttons
-    with Div(v_show="view_mode === 'training'"):
+    with Div(v_show="view_mode === 'training'", classes="d-flex align-center"):
+        vuetify.VSelect(
+            v_model=("training_processes",),
+            items=("[1, 2, 4, 8]",),
+            label="Processes",
+            disabled=("training_running",),
+            dense=True,
+            hide_details=True,
+            classes="mr-4",
+            style="max-width: 100px;",
+        )
         with vuetify.VBtn(
             small=True,
             outlined=True,
@@ -37,8 +47,11 @@ with layout.toolbar as tb:
         ):
             with vuetify.Template(v_slot_loader=True):
                 vuetify.VProgressLinear(
-                    "{{ model_state.epoch }}/{{ epoch_end }}",
-                    value=("100 * model_state.epoch / epoch_end",),
+                    "{{ model_state.epoch }}/{{ epoch_end }}"
+                    " - {{ training_progress.samples_per_second.toFixed(0) }} samples/s",
+                    value=(
+                        "100 * (training_progress.epoch + training_progress.fraction) / epoch_end",
+                    ),
                     striped=True,
                     stream=True,
                     buffer_value=0,
@@ -52,6 +65,22 @@ with layout.toolbar as tb:
             click=ctrl.training_reset,
         )
 
+    # Epoch snapshot used by the execution and testing views
+    vuetify.VSelect(
+        v_show="view_mode !== 'training'",
+        v_model=("prediction_epoch",),
+        items=(
+            "[{ text: 'Latest', value: 0 }].concat(checkpoint_epochs.map("
+            "(e) => ({ text: `Epoch ${e}`, value: e })))",
+        ),
+        label="Model",
+        disabled=("training_running",),
+        dense=True,
+        hide_details=True,
+        classes="mr-4",
+        style="max-width: 120px;",
+    )
+
     # Execution buttons
     with vuetify.VRow(
         v_show="view_mode === 'execution'",
@@ -72,6 +101,19 @@ with layout.toolbar as tb:
                     )
             Span("Toggle search for prediction mismatch")
 
+        with vuetify.VTooltip(bottom=True):
+            with vuetify.Template(v_slot_activator="{ on, attrs }"):
+                with Div(v_bind="attrs", v_on="on", __properties=["v_bind", "v_on"]):
+                    vuetify.VCheckbox(
+                        v_model=("prediction_failure_lowest_confidence", False),
+                        classes="ml-4 my-0 py-0",
+                        dense=True,
+                        hide_details=True,
+                        on_icon="mdi-sort-ascending",
+                        off_icon="mdi-shuffle-variant",
+                    )
+            Span("Toggle mismatch order: lowest confidence first or random")
+
         with vuetify.VTooltip(bottom=True):
             with vuetify.Template(v_slot_activator="{ on, attrs }"):
                 with Div(v_bind="attrs", v_on="on", __properties=["v_bind", "v_on"]):
@@ -92,6 +134,15 @@ with layout.toolbar as tb:
         align="center",
         classes="ma-0",
     ):
+        vuetify.VChip(
+            "{{ mode }}: {{ (100 * accuracy).toFixed(2) }}%",
+            v_for="accuracy, mode in testing_metrics.accuracy",
+            key="mode",
+            v_show="testing_count",
+            classes="ma-2",
+            small=True,
+            outlined=True,
+        )
         vuetify.VChip(
             "{{ testing_count }}",
             classes="ma-2",
@@ -222,7 +273,7 @@ with layout.content:
                 with vuetify.VTooltip(
                     v_for=("result, method, idx in xai_results",),
                     top=("idx === 0",),
-                    bottom=("idx === 1",),
+                    bottom=("idx > 0",),
                     key="method",
                 ):
                     with vuetify.Template(v_slot_activator="{ on, attrs }"):
@@ -244,7 +295,9 @@ with layout.content:
                                     heatmap_opacity=0.85,
                                     heatmap_color_preset="BuRd",  # coolwarm, rainbow, blue2cyan, BuRd
                                     heatmap_active=("`${i-1}`",),
-                                    heatmap_color_range=("[-1, 1]",),
+                                    heatmap_color_range=(
+                                        "result.color_range || [-1, 1]",
+                                    ),
                                     heatmap_color_mode="custom",
                                 )
                     Span(